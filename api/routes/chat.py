@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from app.models.chat_models import ChatRequest, ChatResponse
 from services.ai_service import AIService
 import logging
+import orjson
 from typing import List, Dict, Any
 
 logger = logging.getLogger(__name__)
@@ -20,140 +22,152 @@ def get_ai_service() -> AIService:
     return _ai_service
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(
-    request: Request,
-    ai_service: AIService = Depends(get_ai_service)
-):
+async def _read_chat_request(request: Request) -> ChatRequest:
     """
-    Accept flexible payloads and normalize to ChatRequest.
-    Supports conversation_id for maintaining conversation history.
+    Parse a flexible chat payload and normalize it to ChatRequest.
+    Raises 400 for malformed JSON and 422 when no message can be found.
     """
     try:
-        try:
-            body: Dict[str, Any] = await request.json()
-        except Exception:
-            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        body: Dict[str, Any] = orjson.loads(await request.body())
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
 
-        # ?? DEBUG: Log the entire body
-        logger.info("=" * 60)
-        logger.info("[DEBUG] CHAT ENDPOINT - REQUEST RECEIVED")
-        logger.info(f"[DEBUG] Full request body keys: {list(body.keys())}")
-        logger.info(f"[DEBUG] conversation_id in body: {body.get('conversation_id')}")
-        logger.info(f"[DEBUG] Full body: {body}")
-        logger.info("=" * 60)
+    # ?? DEBUG: Log the entire body
+    logger.info("=" * 60)
+    logger.info("[DEBUG] CHAT ENDPOINT - REQUEST RECEIVED")
+    logger.info(f"[DEBUG] Full request body keys: {list(body.keys())}")
+    logger.info(f"[DEBUG] conversation_id in body: {body.get('conversation_id')}")
+    logger.info(f"[DEBUG] Full body: {body}")
+    logger.info("=" * 60)
 
-        # Extract conversation_id if provided
-        conversation_id = body.get("conversation_id")
-        
-        # ?? DEBUG: Log conversation_id extraction
-        logger.info(f"[DEBUG] Extracted conversation_id: {conversation_id}")
-        logger.info(f"[DEBUG] conversation_id type: {type(conversation_id)}")
+    # Extract conversation_id if provided
+    conversation_id = body.get("conversation_id")
+    
+    # ?? DEBUG: Log conversation_id extraction
+    logger.info(f"[DEBUG] Extracted conversation_id: {conversation_id}")
+    logger.info(f"[DEBUG] conversation_id type: {type(conversation_id)}")
 
-        # 1) Derive message from preferred fields
-        message: str = (body.get("message") or body.get("prompt") or body.get("text") or "").strip()
+    # 1) Derive message from preferred fields
+    message: str = (body.get("message") or body.get("prompt") or body.get("text") or "").strip()
 
-        # 2) Derive from messages[] if needed
-        if not message and isinstance(body.get("messages"), list):
+    # 2) Derive from messages[] if needed
+    if not message and isinstance(body.get("messages"), list):
+        for m in reversed(body["messages"]):
+            if not isinstance(m, dict):
+                continue
+            content = (str(m.get("content") or m.get("message") or m.get("text") or "")).strip()
+            role = (m.get("role") or "").strip().lower()
+            if role == "user" and content:
+                message = content
+                break
+        # fallback: last non-empty content
+        if not message:
             for m in reversed(body["messages"]):
                 if not isinstance(m, dict):
                     continue
                 content = (str(m.get("content") or m.get("message") or m.get("text") or "")).strip()
-                role = (m.get("role") or "").strip().lower()
-                if role == "user" and content:
+                if content:
                     message = content
                     break
-            # fallback: last non-empty content
-            if not message:
-                for m in reversed(body["messages"]):
-                    if not isinstance(m, dict):
-                        continue
-                    content = (str(m.get("content") or m.get("message") or m.get("text") or "")).strip()
-                    if content:
-                        message = content
-                        break
 
-        # Prepare conversation history (normalize entries)
-        raw_history = body.get("conversation_history")
-        normalized_history: List[Dict[str, Any]] = []
+    # Prepare conversation history (normalize entries)
+    raw_history = body.get("conversation_history")
+    normalized_history: List[Dict[str, Any]] = []
 
-        if isinstance(raw_history, list):
-            for item in raw_history:
-                if not isinstance(item, dict):
-                    continue
-                # map possible keys to expected ones
-                role = (item.get("role") or "").strip().lower()
-                username = item.get("username")
-                if not username:
-                    username = "User" if role == "user" else ("Assistant" if role else "Assistant")
-                content = (str(item.get("content") or item.get("message") or item.get("text") or "")).strip()
-                ts = item.get("timestamp") or item.get("time") or None
-
-                normalized_history.append({
-                    "username": username,
-                    "content": content,
-                    "timestamp": ts
-                })
-
-            # 3) Derive message from conversation_history if still missing
+    if isinstance(raw_history, list):
+        for item in raw_history:
+            if not isinstance(item, dict):
+                continue
+            # map possible keys to expected ones
+            role = (item.get("role") or "").strip().lower()
+            username = item.get("username")
+            if not username:
+                username = "User" if role == "user" else ("Assistant" if role else "Assistant")
+            content = (str(item.get("content") or item.get("message") or item.get("text") or "")).strip()
+            ts = item.get("timestamp") or item.get("time") or None
+
+            normalized_history.append({
+                "username": username,
+                "content": content,
+                "timestamp": ts
+            })
+
+        # 3) Derive message from conversation_history if still missing
+        if not message:
+            # prefer last user entry with non-empty content
+            for m in reversed(normalized_history):
+                if m.get("username", "").strip().lower() == "user" and m.get("content"):
+                    message = m["content"].strip()
+                    break
+            # fallback: any last non-empty content
             if not message:
-                # prefer last user entry with non-empty content
                 for m in reversed(normalized_history):
-                    if m.get("username", "").strip().lower() == "user" and m.get("content"):
+                    if m.get("content"):
                         message = m["content"].strip()
                         break
-                # fallback: any last non-empty content
-                if not message:
-                    for m in reversed(normalized_history):
-                        if m.get("content"):
-                            message = m["content"].strip()
-                            break
-
-        # Also map messages[] to history if history not provided
-        if not normalized_history and isinstance(body.get("messages"), list):
-            for m in body["messages"]:
-                if not isinstance(m, dict):
-                    continue
-                role = (m.get("role") or "").strip().lower()
-                username = "User" if role == "user" else "Assistant"
-                content = (str(m.get("content") or m.get("message") or m.get("text") or "")).strip()
-                ts = m.get("timestamp") or m.get("time") or None
-                normalized_history.append({
-                    "username": username,
-                    "content": content,
-                    "timestamp": ts
-                })
 
-        if not message:
-            logger.warning("/api/v1/chat missing 'message'. Body keys: %s", list(body.keys()))
-            raise HTTPException(status_code=422, detail="Field 'message' is required")
-
-        normalized_payload: Dict[str, Any] = {
-            "message": message,
-            "conversation_history": normalized_history,
-            "user_id": body.get("user_id"),
-            "room_id": body.get("room_id"),
-            "conversation_id": conversation_id,
-        }
+    # Also map messages[] to history if history not provided
+    if not normalized_history and isinstance(body.get("messages"), list):
+        for m in body["messages"]:
+            if not isinstance(m, dict):
+                continue
+            role = (m.get("role") or "").strip().lower()
+            username = "User" if role == "user" else "Assistant"
+            content = (str(m.get("content") or m.get("message") or m.get("text") or "")).strip()
+            ts = m.get("timestamp") or m.get("time") or None
+            normalized_history.append({
+                "username": username,
+                "content": content,
+                "timestamp": ts
+            })
 
-        # ?? DEBUG: Log normalized payload
-        logger.info("=" * 60)
-        logger.info("[DEBUG] NORMALIZED PAYLOAD")
-        logger.info(f"[DEBUG] normalized_payload conversation_id: {normalized_payload.get('conversation_id')}")
-        logger.info(f"[DEBUG] normalized_payload keys: {list(normalized_payload.keys())}")
-        logger.info("=" * 60)
+    if not message:
+        logger.warning("/api/v1/chat missing 'message'. Body keys: %s", list(body.keys()))
+        raise HTTPException(status_code=422, detail="Field 'message' is required")
+
+    normalized_payload: Dict[str, Any] = {
+        "message": message,
+        "conversation_history": normalized_history,
+        "user_id": body.get("user_id"),
+        "room_id": body.get("room_id"),
+        "conversation_id": conversation_id,
+    }
+
+    # ?? DEBUG: Log normalized payload
+    logger.info("=" * 60)
+    logger.info("[DEBUG] NORMALIZED PAYLOAD")
+    logger.info(f"[DEBUG] normalized_payload conversation_id: {normalized_payload.get('conversation_id')}")
+    logger.info(f"[DEBUG] normalized_payload keys: {list(normalized_payload.keys())}")
+    logger.info("=" * 60)
+
+    chat_req = ChatRequest.model_validate(normalized_payload)
+    
+    # ?? DEBUG: Log ChatRequest model
+    logger.info("=" * 60)
+    logger.info("[DEBUG] CHAT REQUEST MODEL")
+    logger.info(f"[DEBUG] chat_req.conversation_id: {chat_req.conversation_id}")
+    logger.info(f"[DEBUG] chat_req.message: {chat_req.message[:80]}...")
+    logger.info(f"[DEBUG] chat_req.user_id: {chat_req.user_id}")
+    logger.info(f"[DEBUG] chat_req.room_id: {chat_req.room_id}")
+    logger.info("=" * 60)
+
+    return chat_req
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(
+    request: Request,
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """
+    Accept flexible payloads and normalize to ChatRequest.
+    Supports conversation_id for maintaining conversation history.
+    """
+    try:
+        chat_req = await _read_chat_request(request)
 
-        chat_req = ChatRequest.model_validate(normalized_payload)
-        
-        # ?? DEBUG: Log ChatRequest model
-        logger.info("=" * 60)
-        logger.info("[DEBUG] CHAT REQUEST MODEL")
-        logger.info(f"[DEBUG] chat_req.conversation_id: {chat_req.conversation_id}")
-        logger.info(f"[DEBUG] chat_req.message: {chat_req.message[:80]}...")
-        logger.info(f"[DEBUG] chat_req.user_id: {chat_req.user_id}")
-        logger.info(f"[DEBUG] chat_req.room_id: {chat_req.room_id}")
-        logger.info("=" * 60)
-        
         logger.info("Chat request received: %s... (conversation_id: %s)", 
                    chat_req.message[:80], 
                    chat_req.conversation_id)
@@ -203,6 +217,54 @@ async def chat_endpoint(
         raise HTTPException(status_code=500, detail=f"Failed to generate response: {str(e)}")
 
 
+@router.post("/chat/stream")
+async def chat_stream_endpoint(
+    request: Request,
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """
+    Streaming variant of /chat: accepts the same payloads and streams the
+    formatted markdown as Server-Sent Events while Claude generates it.
+    
+    Frames are {"type": "content", "text": "..."} followed by a final
+    {"type": "done", ...} or {"type": "error", ...} frame.
+    """
+    chat_req = await _read_chat_request(request)
+    if not ai_service.claude_client.is_enabled:
+        raise HTTPException(status_code=503, detail="Claude AI is not configured")
+
+    async def event_stream():
+        try:
+            async for text in ai_service.stream_response(
+                user_input=chat_req.message,
+                history=chat_req.conversation_history,
+                conversation_id=chat_req.conversation_id
+            ):
+                yield b"data: " + orjson.dumps({"type": "content", "text": text}) + b"\n\n"
+
+            conversation_length = (
+                ai_service.claude_client.get_conversation_count(chat_req.conversation_id)
+                if chat_req.conversation_id else 0
+            )
+            yield b"data: " + orjson.dumps({
+                "type": "done",
+                "conversation_id": chat_req.conversation_id,
+                "conversation_length": conversation_length
+            }) + b"\n\n"
+        except Exception as e:
+            logger.error(f"Error in chat stream: {e}", exc_info=True)
+            yield b"data: " + orjson.dumps({"type": "error", "error": str(e)}) + b"\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 @router.get("/chat/health")
 async def chat_health_check():
     try:
@@ -251,7 +313,7 @@ async def clear_chat_conversation(
         if not ai_service.claude_client.is_enabled:
             raise HTTPException(status_code=503, detail="AI features not configured")
         
-        ai_service.claude_client.clear_conversation(conversation_id)
+        await ai_service.claude_client.aclear_conversation(conversation_id)
         return {
             "success": True,
             "message": f"Conversation history cleared for: {conversation_id}"
@@ -4,14 +4,17 @@ Integrates Claude AI to generate 3D model descriptions and convert to GLB/GLTF
 """
 
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+import importlib.util
 import logging
 import uuid
 import os
 from datetime import datetime, timezone
-import json
+from functools import lru_cache
+import orjson
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +27,58 @@ models_db: Dict[str, Dict] = {}
 MODELS_DIR = os.path.join(os.getcwd(), "static", "models")
 os.makedirs(MODELS_DIR, exist_ok=True)
 
+# Availability of the optional 3D library, checked without importing it
+# (trimesh is slow to import and only needed when a model is generated)
+TRIMESH_AVAILABLE = importlib.util.find_spec("trimesh") is not None
+
+# System prompt for 3D spec generation ({style}/{complexity} filled per request)
+MODEL_3D_SYSTEM_PROMPT_TEMPLATE = """You are a 3D modeling expert assistant. Generate detailed 3D model specifications based on user descriptions.
+
+Your response MUST be valid JSON with this exact structure:
+{{
+    "title": "Brief model name",
+    "description": "Detailed description",
+    "geometry": {{
+        "primary_shape": "box|sphere|cylinder|custom",
+        "dimensions": {{"width": 1.0, "height": 1.0, "depth": 1.0}},
+        "components": [
+            {{
+                "type": "component name",
+                "shape": "box|sphere|cylinder",
+                "position": {{"x": 0, "y": 0, "z": 0}},
+                "scale": {{"x": 1, "y": 1, "z": 1}},
+                "rotation": {{"x": 0, "y": 0, "z": 0}},
+                "color": "#RRGGBB"
+            }}
+        ]
+    }},
+    "materials": {{
+        "base_color": "#RRGGBB",
+        "metallic": 0.5,
+        "roughness": 0.5,
+        "emissive": "#000000"
+    }},
+    "style": "{style}",
+    "complexity": "{complexity}"
+}}
+
+Guidelines:
+- Break complex objects into multiple components
+- Use realistic proportions and positioning
+- Specify colors in hex format (#RRGGBB)
+- Position components relative to center (0,0,0)
+- Scale values are multipliers (1.0 = normal size)
+- Rotation in degrees (0-360)
+
+Style={style}, Complexity={complexity}
+"""
+
+
+@lru_cache(maxsize=64)
+def _model_3d_system_prompt(style: str, complexity: str) -> str:
+    """Formatted 3D system prompt, reused so identical requests share one cached prefix"""
+    return MODEL_3D_SYSTEM_PROMPT_TEMPLATE.format(style=style, complexity=complexity)
+
 
 # Request/Response Models
 class Generate3DModelRequest(BaseModel):
@@ -77,46 +132,7 @@ async def generate_3d_description_with_claude(prompt: str, style: str, complexit
         )
     
     # Build specialized prompt for 3D model generation
-    system_prompt = f"""You are a 3D modeling expert assistant. Generate detailed 3D model specifications based on user descriptions.
-
-Your response MUST be valid JSON with this exact structure:
-{{
-    "title": "Brief model name",
-    "description": "Detailed description",
-    "geometry": {{
-        "primary_shape": "box|sphere|cylinder|custom",
-        "dimensions": {{"width": 1.0, "height": 1.0, "depth": 1.0}},
-        "components": [
-            {{
-                "type": "component name",
-                "shape": "box|sphere|cylinder",
-                "position": {{"x": 0, "y": 0, "z": 0}},
-                "scale": {{"x": 1, "y": 1, "z": 1}},
-                "rotation": {{"x": 0, "y": 0, "z": 0}},
-                "color": "#RRGGBB"
-            }}
-        ]
-    }},
-    "materials": {{
-        "base_color": "#RRGGBB",
-        "metallic": 0.5,
-        "roughness": 0.5,
-        "emissive": "#000000"
-    }},
-    "style": "{style}",
-    "complexity": "{complexity}"
-}}
-
-Guidelines:
-- Break complex objects into multiple components
-- Use realistic proportions and positioning
-- Specify colors in hex format (#RRGGBB)
-- Position components relative to center (0,0,0)
-- Scale values are multipliers (1.0 = normal size)
-- Rotation in degrees (0-360)
-
-Style={style}, Complexity={complexity}
-"""
+    system_prompt = _model_3d_system_prompt(style, complexity)
 
     user_prompt = f"Generate a 3D model specification for: {prompt}"
     
@@ -140,12 +156,12 @@ Style={style}, Complexity={complexity}
         json_str = json_str.strip()
         
         # Parse JSON
-        model_spec = json.loads(json_str)
+        model_spec = orjson.loads(json_str)
         
         logger.info(f"Generated 3D model specification: {model_spec.get('title')}")
         return model_spec
         
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error(f"Failed to parse Claude response as JSON: {e}")
         logger.error(f"Response was: {response}")
         # Return fallback specification
@@ -303,7 +319,8 @@ async def generate_3d_model(request: Generate3DModelRequest):
         filename = f"{model_id}.glb"
         output_path = os.path.join(MODELS_DIR, filename)
         
-        create_glb_from_specification(spec, output_path)
+        # trimesh geometry and the GLB write are blocking; keep them off the event loop
+        await run_in_threadpool(create_glb_from_specification, spec, output_path)
         
         # Step 3: Get file size
         file_size = os.path.getsize(output_path)
@@ -406,20 +423,14 @@ async def model_3d_health():
     
     claude = get_claude_client()
     
-    try:
-        import trimesh
-        trimesh_available = True
-    except ImportError:
-        trimesh_available = False
-    
     return {
         "status": "healthy",
         "claude_enabled": claude.is_enabled,
-        "trimesh_available": trimesh_available,
+        "trimesh_available": TRIMESH_AVAILABLE,
         "models_count": len(models_db),
         "features": {
             "ai_description_generation": claude.is_enabled,
-            "procedural_modeling": trimesh_available,
-            "glb_export": trimesh_available
+            "procedural_modeling": TRIMESH_AVAILABLE,
+            "glb_export": TRIMESH_AVAILABLE
         }
     }
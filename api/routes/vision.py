@@ -1,11 +1,10 @@
 """
 Vision API routes for image analysis using Claude
 """
-import os
 import logging
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import anthropic
+from utils.claude_client import get_claude_client
 
 logger = logging.getLogger(__name__)
 
@@ -29,15 +28,15 @@ async def analyze_image(request: ImageAnalysisRequest):
     - Text extraction (OCR)
     - Visual question answering
     """
+    import anthropic  # lazy: the SDK is slow to import
     try:
-        api_key = os.environ.get("ANTHROPIC_API_KEY")
-        if not api_key:
+        # Reuse the shared client (and its connection pool) instead of one per request
+        claude = get_claude_client()
+        if not claude.is_enabled:
             raise HTTPException(status_code=500, detail="ANTHROPIC_API_KEY not configured")
         
-        client = anthropic.Anthropic(api_key=api_key)
-        
-        message = client.messages.create(
-            model="claude-sonnet-4-5-20250929",
+        message = await claude.client.messages.create(
+            model=claude.active_model,
             max_tokens=1024,
             messages=[
                 {
@@ -4,7 +4,7 @@ Real-time messaging with WebSocket support and Bunny.net Stream integration
 """
 
 import os
-import json
+import orjson
 import uuid
 import logging
 from datetime import datetime, timezone
@@ -21,11 +21,12 @@ from pydantic import BaseModel, Field, field_validator, ConfigDict
 from middleware.rate_limit import RateLimitMiddleware, RateLimitConfig
 
 from utils.streaming_ai_endpoints import streaming_ai_router
+from utils.claude_client import close_claude_client
 from api.routes.chat import router as chat_router
 from api.routes.vision import router as vision_router  # NEW: Vision API
 from api.routes.model_3d import router as model_3d_router  # NEW: 3D Model API
 from routers.models_3d import router as models_3d_router  # NEW: Simple /3d endpoints
-from routers.gpu_models import router as gpu_models_router  # NEW: GPU 3D generation
+from routers.gpu_models import router as gpu_models_router, close_worker_client  # NEW: GPU 3D generation
 from routers.static_models import router as static_models_router  # Serve GLB with proper headers
 
 load_dotenv()
@@ -155,6 +156,8 @@ async def lifespan(app: FastAPI):
         yield
     finally:
         logger.info("🛑 Shutting down FastAPI Video Chat Application")
+        await close_claude_client()
+        await close_worker_client()
 
 app = FastAPI(
     title="FastAPI Video Chat",
@@ -238,6 +241,9 @@ async def global_exception_handler(request: Request, exc: Exception):
 # Initialize connection manager
 manager = ConnectionManager()
 
+# Static reply for malformed chat frames, serialized once
+INVALID_MESSAGE_FRAME = orjson.dumps({"type": "error", "message": "Invalid message format"}).decode()
+
 @app.get("/")
 def root():
     return {
@@ -477,13 +483,13 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, user_id: str):
         "user_id": user.id,
         "timestamp": datetime.now(timezone.utc).isoformat() + "Z"
     }
-    await manager.broadcast_to_room(json.dumps(join_message), room_id)
+    await manager.broadcast_to_room(orjson.dumps(join_message).decode(), room_id)
 
     try:
         while True:
             data = await websocket.receive_text()
             try:
-                message_data = json.loads(data)
+                message_data = orjson.loads(data)
             except Exception:
                 message_data = {"content": str(data)}
 
@@ -494,12 +500,12 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, user_id: str):
                 event_payload.setdefault("user_id", user_id)
                 event_payload.setdefault("username", user.username)
                 event_payload.setdefault("timestamp", datetime.now(timezone.utc).isoformat() + "Z")
-                await manager.broadcast_to_room(json.dumps(event_payload), room_id)
+                await manager.broadcast_to_room(orjson.dumps(event_payload).decode(), room_id)
                 continue
 
             # Standard chat message expects a content field
             if not isinstance(message_data, dict) or "content" not in message_data:
-                await websocket.send_text(json.dumps({"type": "error", "message": "Invalid message format"}))
+                await websocket.send_text(INVALID_MESSAGE_FRAME)
                 continue
 
             content = (message_data.get("content") or "").strip()
@@ -527,7 +533,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, user_id: str):
                 "content": message.content,
                 "timestamp": message.timestamp
             }
-            await manager.broadcast_to_room(json.dumps(broadcast_data), room_id)
+            await manager.broadcast_to_room(orjson.dumps(broadcast_data).decode(), room_id)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket, room_id, user_id)
@@ -538,7 +544,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, user_id: str):
             "user_id": user.id,
             "timestamp": datetime.now(timezone.utc).isoformat() + "Z"
         }
-        await manager.broadcast_to_room(json.dumps(leave_message), room_id)
+        await manager.broadcast_to_room(orjson.dumps(leave_message).decode(), room_id)
         logger.info(f"WebSocket disconnected for user {user.username}")
 
     except Exception as e:
@@ -33,6 +33,30 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 GPU_WORKER_URL = os.getenv("GPU_WORKER_URL", "http://localhost:8001")
 GPU_WORKER_API_KEY = os.getenv("GPU_WORKER_API_KEY", "")
 
+# Per-call timeouts (seconds) for requests to the GPU worker
+WORKER_POLL_TIMEOUT = 10.0
+WORKER_REQUEST_TIMEOUT = 30.0
+WORKER_HEALTH_TIMEOUT = 5.0
+WORKER_HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+
+_worker_client: Optional[httpx.AsyncClient] = None
+
+
+def get_worker_client() -> httpx.AsyncClient:
+    """Get the shared GPU worker client so polls and proxies reuse keep-alive connections"""
+    global _worker_client
+    if _worker_client is None or _worker_client.is_closed:
+        _worker_client = httpx.AsyncClient(timeout=WORKER_REQUEST_TIMEOUT, limits=WORKER_HTTP_LIMITS)
+    return _worker_client
+
+
+async def close_worker_client() -> None:
+    """Close the shared GPU worker client on shutdown, if it was ever created"""
+    global _worker_client
+    if _worker_client is not None:
+        await _worker_client.aclose()
+        _worker_client = None
+
 class JobStatus(BaseModel):
     job_id: str
     status: str  # "queued", "processing", "complete", "failed"
@@ -52,47 +76,47 @@ async def poll_worker_status(job_id: str, worker_job_id: str):
     jobs[job_id]["worker_job_id"] = worker_job_id
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            while attempt < max_attempts:
-                try:
-                    # Check worker status
-                    response = await client.get(f"{GPU_WORKER_URL}/status/{worker_job_id}")
+        client = get_worker_client()
+        while attempt < max_attempts:
+            try:
+                # Check worker status
+                response = await client.get(f"{GPU_WORKER_URL}/status/{worker_job_id}", timeout=WORKER_POLL_TIMEOUT)
+                
+                if response.status_code == 200:
+                    worker_job = response.json()
                     
-                    if response.status_code == 200:
-                        worker_job = response.json()
-                        
-                        # Update our job with worker status
-                        if worker_job["status"] == "processing":
-                            jobs[job_id]["status"] = "processing"
-                            jobs[job_id]["progress"] = min(90, 20 + (attempt * 2))  # Estimate progress
-                            jobs[job_id]["message"] = "Generating 3D model on GPU worker..."
-                        
-                        elif worker_job["status"] == "complete":
-                            # Don't download - Railway filesystem is ephemeral!
-                            # Instead, proxy the GLB through our /gpu/preview endpoint
-                            jobs[job_id]["status"] = "complete"
-                            jobs[job_id]["progress"] = 100
-                            jobs[job_id]["message"] = "Model generated successfully"
-                            jobs[job_id]["glb_url"] = f"/gpu/preview/{job_id}.glb"  # Proxy endpoint
-                            jobs[job_id]["generation_time"] = worker_job.get("generation_time")
-                            jobs[job_id]["completed_at"] = datetime.now(timezone.utc).isoformat() + "Z"
-                            logger.info(f"✅ Job {job_id} completed - GLB available at worker")
-                            return
-                        
-                        elif worker_job["status"] == "failed":
-                            raise Exception(worker_job.get("error", "Worker generation failed"))
+                    # Update our job with worker status
+                    if worker_job["status"] == "processing":
+                        jobs[job_id]["status"] = "processing"
+                        jobs[job_id]["progress"] = min(90, 20 + (attempt * 2))  # Estimate progress
+                        jobs[job_id]["message"] = "Generating 3D model on GPU worker..."
                     
-                    await asyncio.sleep(2)
-                    attempt += 1
+                    elif worker_job["status"] == "complete":
+                        # Don't download - Railway filesystem is ephemeral!
+                        # Instead, proxy the GLB through our /gpu/preview endpoint
+                        jobs[job_id]["status"] = "complete"
+                        jobs[job_id]["progress"] = 100
+                        jobs[job_id]["message"] = "Model generated successfully"
+                        jobs[job_id]["glb_url"] = f"/gpu/preview/{job_id}.glb"  # Proxy endpoint
+                        jobs[job_id]["generation_time"] = worker_job.get("generation_time")
+                        jobs[job_id]["completed_at"] = datetime.now(timezone.utc).isoformat() + "Z"
+                        logger.info(f"✅ Job {job_id} completed - GLB available at worker")
+                        return
                     
-                except httpx.RequestError as e:
-                    logger.warning(f"Worker polling error (attempt {attempt}): {e}")
-                    await asyncio.sleep(2)
-                    attempt += 1
-            
-            # Timeout
-            raise Exception("Generation timed out after 5 minutes")
-            
+                    elif worker_job["status"] == "failed":
+                        raise Exception(worker_job.get("error", "Worker generation failed"))
+                
+                await asyncio.sleep(2)
+                attempt += 1
+                
+            except httpx.RequestError as e:
+                logger.warning(f"Worker polling error (attempt {attempt}): {e}")
+                await asyncio.sleep(2)
+                attempt += 1
+        
+        # Timeout
+        raise Exception("Generation timed out after 5 minutes")
+        
     except Exception as e:
         logger.error(f"❌ Job {job_id} failed: {e}")
         jobs[job_id]["status"] = "failed"
@@ -117,44 +141,45 @@ async def process_image_to_3d(job_id: str, image_data: bytes, prompt: str,
             f.write(image_data)
         
         # Send to GPU worker
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            headers = {}
-            if GPU_WORKER_API_KEY:
-                headers["X-API-Key"] = GPU_WORKER_API_KEY
-            
-            # Send image file to GPU worker
-            logger.info(f"Sending job {job_id} to GPU worker at {GPU_WORKER_URL}")
-            
-            # Create multipart form data
-            files = {
-                'image': ('image.png', image_data, 'image/png')
-            }
-            data = {
-                'texture_resolution': texture_resolution,
-                'mc_resolution': mc_resolution
-            }
-            
-            response = await client.post(
-                f"{GPU_WORKER_URL}/generate-from-image",
-                files=files,
-                data=data,
-                headers=headers
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Worker rejected request: {response.text}")
-            
-            worker_response = response.json()
-            worker_job_id = worker_response["job_id"]
-            
-            logger.info(f"GPU worker accepted job {job_id} as worker job {worker_job_id}")
-            
-            # Clean up temp image
-            if temp_image_path.exists():
-                temp_image_path.unlink()
-            
-            # Poll worker for completion
-            await poll_worker_status(job_id, worker_job_id)
+        client = get_worker_client()
+        headers = {}
+        if GPU_WORKER_API_KEY:
+            headers["X-API-Key"] = GPU_WORKER_API_KEY
+        
+        # Send image file to GPU worker
+        logger.info(f"Sending job {job_id} to GPU worker at {GPU_WORKER_URL}")
+        
+        # Create multipart form data
+        files = {
+            'image': ('image.png', image_data, 'image/png')
+        }
+        data = {
+            'texture_resolution': texture_resolution,
+            'mc_resolution': mc_resolution
+        }
+        
+        response = await client.post(
+            f"{GPU_WORKER_URL}/generate-from-image",
+            files=files,
+            data=data,
+            headers=headers,
+            timeout=WORKER_REQUEST_TIMEOUT
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"Worker rejected request: {response.text}")
+        
+        worker_response = response.json()
+        worker_job_id = worker_response["job_id"]
+        
+        logger.info(f"GPU worker accepted job {job_id} as worker job {worker_job_id}")
+        
+        # Clean up temp image
+        if temp_image_path.exists():
+            temp_image_path.unlink()
+        
+        # Poll worker for completion
+        await poll_worker_status(job_id, worker_job_id)
         
     except Exception as e:
         logger.error(f"❌ Failed to process job {job_id}: {e}")
@@ -255,24 +280,24 @@ async def preview_model(filename: str):
         raise HTTPException(status_code=500, detail="Worker job ID not found")
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # Get GLB from worker
-            worker_glb_url = f"{GPU_WORKER_URL}/outputs/{worker_job_id}/model.glb"
-            logger.info(f"Proxying GLB preview from: {worker_glb_url}")
-            response = await client.get(worker_glb_url)
-            
-            if response.status_code == 200:
-                return Response(
-                    content=response.content,
-                    media_type="model/gltf-binary",
-                    headers={
-                        "Access-Control-Allow-Origin": "*",
-                        "Cache-Control": "public, max-age=3600"
-                    }
-                )
-            else:
-                logger.error(f"Worker GLB fetch failed: {response.status_code}")
-                raise HTTPException(status_code=response.status_code, detail="GLB not available")
+        client = get_worker_client()
+        # Get GLB from worker
+        worker_glb_url = f"{GPU_WORKER_URL}/outputs/{worker_job_id}/model.glb"
+        logger.info(f"Proxying GLB preview from: {worker_glb_url}")
+        response = await client.get(worker_glb_url, timeout=WORKER_REQUEST_TIMEOUT)
+        
+        if response.status_code == 200:
+            return Response(
+                content=response.content,
+                media_type="model/gltf-binary",
+                headers={
+                    "Access-Control-Allow-Origin": "*",
+                    "Cache-Control": "public, max-age=3600"
+                }
+            )
+        else:
+            logger.error(f"Worker GLB fetch failed: {response.status_code}")
+            raise HTTPException(status_code=response.status_code, detail="GLB not available")
     except httpx.RequestError as e:
         logger.error(f"Preview proxy error: {e}")
         raise HTTPException(status_code=500, detail=f"Worker connection error: {str(e)}")
@@ -298,25 +323,25 @@ async def download_model(job_id: str):
     
     # Proxy download from GPU worker (full ZIP with OBJ+MTL+textures)
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            worker_download_url = f"{GPU_WORKER_URL}/download/{worker_job_id}"
-            logger.info(f"Proxying download from: {worker_download_url}")
-            response = await client.get(worker_download_url)
-            
-            if response.status_code == 200:
-                return Response(
-                    content=response.content,
-                    media_type="application/zip",
-                    headers={
-                        "Content-Disposition": f"attachment; filename=model_{job_id}.zip"
-                    }
-                )
-            else:
-                logger.error(f"Worker download failed: {response.status_code}")
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail="Failed to download from worker"
-                )
+        client = get_worker_client()
+        worker_download_url = f"{GPU_WORKER_URL}/download/{worker_job_id}"
+        logger.info(f"Proxying download from: {worker_download_url}")
+        response = await client.get(worker_download_url, timeout=WORKER_REQUEST_TIMEOUT)
+        
+        if response.status_code == 200:
+            return Response(
+                content=response.content,
+                media_type="application/zip",
+                headers={
+                    "Content-Disposition": f"attachment; filename=model_{job_id}.zip"
+                }
+            )
+        else:
+            logger.error(f"Worker download failed: {response.status_code}")
+            raise HTTPException(
+                status_code=response.status_code,
+                detail="Failed to download from worker"
+            )
     except httpx.RequestError as e:
         logger.error(f"Download proxy error: {e}")
         raise HTTPException(status_code=500, detail=f"Worker connection error: {str(e)}")
@@ -328,11 +353,11 @@ async def gpu_health_check():
     worker_info = {}
     
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{GPU_WORKER_URL}/health")
-            if response.status_code == 200:
-                worker_status = "connected"
-                worker_info = response.json()
+        client = get_worker_client()
+        response = await client.get(f"{GPU_WORKER_URL}/health", timeout=WORKER_HEALTH_TIMEOUT)
+        if response.status_code == 200:
+            worker_status = "connected"
+            worker_info = response.json()
     except Exception as e:
         worker_status = f"disconnected: {str(e)}"
     
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List
 import os
@@ -51,7 +52,8 @@ async def generate_3d_model(request: Generate3DModelRequest):
     from utils.model_generator import generate_model_from_prompt
     
     try:
-        generate_model_from_prompt(request.prompt, model_path)
+        # Mesh building and the GLB write are blocking; keep them off the event loop
+        await run_in_threadpool(generate_model_from_prompt, request.prompt, model_path)
         file_size = os.path.getsize(model_path)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional
 from app.models.chat_models import Message
 from services.context_analyzer import ContextAnalyzer
 from services.format_selector import FormatSelector, FormatType
@@ -9,6 +9,23 @@ import re
 
 logger = logging.getLogger(__name__)
 
+# Patterns for the markdown safety net, compiled once at import
+NUMBERED_LIST_PATTERN = re.compile(r'^\d+\.\s')
+PAREN_NUMBERED_PATTERN = re.compile(r'^(\d+\))\s*(.+)$')  # Only match "1)" style, not "1."
+WORD_NUMBERED_PATTERN = re.compile(
+    r'^(First|Second|Third|Fourth|Fifth|Sixth|Seventh|Eighth|Ninth|Tenth)[,:]?\s*(.+)$',
+    re.IGNORECASE
+)
+MARKDOWN_STRUCTURE_PATTERN = re.compile(
+    r'^#+\s'           # Headers
+    r'|^\s*[-*]\s'     # Bullet lists
+    r'|^\s*\d+\.\s'   # Numbered lists (e.g., "1. ")
+    r'|\*\*\w+\*\*'    # Bold
+    r'|`\w+`'          # Inline code
+    r'|```',           # Code blocks
+    re.MULTILINE
+)
+
 
 class AIService:
     """Main service that orchestrates AI response generation with context-aware formatting and web search."""
@@ -90,6 +107,37 @@ class AIService:
             logger.error(f"Error in generate_response: {e}", exc_info=True)
             return self._generate_fallback(user_input, error=str(e), conversation_id=conversation_id)
 
+    async def stream_response(
+        self,
+        user_input: str,
+        history: List[Message],
+        conversation_id: Optional[str] = None,
+        enable_search: bool = True
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of generate_response.
+        
+        Yields formatted markdown as Claude produces it; formatting is applied
+        line by line, so the first lines reach the client before generation ends.
+        The plain-text-to-markdown safety net needs the full response and is
+        not applied here.
+        """
+        context = self.context_analyzer.analyze(user_input, history)
+        format_type = self.format_selector.select_format(context)
+        format_rules = self.format_selector.get_format_rules(format_type)
+        logger.info(f"Selected format: {format_type.value}, rules: {format_rules}")
+
+        chunks = self.claude_client.stream_response(
+            prompt=user_input,
+            max_tokens=2048,
+            temperature=0.7,
+            system_prompt=self._build_markdown_system_prompt(context, format_rules),
+            conversation_id=conversation_id,
+            enable_search=enable_search
+        )
+        async for text in self.formatter.format_stream(chunks, format_rules):
+            yield text
+
     async def _generate_with_model(
         self,
         user_input: str,
@@ -223,17 +271,14 @@ class AIService:
                 continue
 
             # Preserve numbered lists - DON'T convert them
-            if re.match(r'^\d+\.\s', stripped):
+            if NUMBERED_LIST_PATTERN.match(stripped):
                 # Already a numbered list - preserve it
                 formatted_lines.append(line)
                 continue
 
             # Convert ONLY explicit numbered patterns like "1)" or word-based numbering
-            numbered_pattern = r'^(\d+\))\s*(.+)$'  # Only match "1)" style, not "1."
-            word_number_pattern = r'^(First|Second|Third|Fourth|Fifth|Sixth|Seventh|Eighth|Ninth|Tenth)[,:]?\s*(.+)$'
-
-            numbered_match = re.match(numbered_pattern, stripped)
-            word_match = re.match(word_number_pattern, stripped, re.IGNORECASE)
+            numbered_match = PAREN_NUMBERED_PATTERN.match(stripped)
+            word_match = WORD_NUMBERED_PATTERN.match(stripped)
 
             if numbered_match:
                 # Convert "1)" style to bullet point
@@ -259,23 +304,14 @@ class AIService:
 
         # Join and clean up excessive blank lines
         result = '\n'.join(formatted_lines)
-        result = re.sub(r'\n{3,}', '\n\n', result)
+        # str.replace beats a regex here, and the 'in' check usually fails at once
+        while '\n\n\n' in result:
+            result = result.replace('\n\n\n', '\n\n')
         return result.strip()
 
     def _has_markdown_structure(self, content: str) -> bool:
         """Check if content already has markdown formatting."""
-        markdown_indicators = [
-            r'^#+\s',           # Headers
-            r'^\s*[-*]\s',      # Bullet lists
-            r'^\s*\d+\.\s',     # Numbered lists (e.g., "1. ")
-            r'\*\*\w+\*\*',     # Bold
-            r'`\w+`',           # Inline code
-            r'```',             # Code blocks
-        ]
-        for pattern in markdown_indicators:
-            if re.search(pattern, content, re.MULTILINE):
-                return True
-        return False
+        return MARKDOWN_STRUCTURE_PATTERN.search(content) is not None
 
     def _quality_check(self, formatted_response: str) -> bool:
         """
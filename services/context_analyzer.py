@@ -2,6 +2,9 @@ from typing import Dict, List, Optional
 from app.models.chat_models import Message
 import re
 
+# Phrases that ask for a code example (matched against lowercased text)
+CODE_REQUEST_PATTERN = re.compile(r'show me an example|code for|how do i write|sample code|snippet for')
+
 class ContextAnalyzer:
     """Analyzes conversation context to determine formatting needs."""
 
@@ -50,15 +53,7 @@ class ContextAnalyzer:
 
     def _requires_code_example(self, text: str) -> bool:
         """Check if the user is asking for a code example."""
-        code_request_patterns = [
-            r'show me an example',
-            r'code for',
-            r'how do I write',
-            r'sample code',
-            r'snippet for'
-        ]
-        text_lower = text.lower()
-        return any(re.search(pattern, text_lower) for pattern in code_request_patterns) or self._is_technical_query(text)
+        return bool(CODE_REQUEST_PATTERN.search(text.lower())) or self._is_technical_query(text)
 
     def _analyze_tone(self, history: List[Message]) -> str:
         """Analyze the overall tone of the conversation history."""
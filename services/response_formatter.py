@@ -1,5 +1,23 @@
 import re
-from typing import Dict, List
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Sequence
+
+# Compiled once at import; format_response runs on every AI reply
+CODE_BLOCK_PATTERN = re.compile(r"(```.*?```)", re.DOTALL)
+# Bullets (* or -) and numbered items (1., 2., ...) in a single pass
+LIST_ITEM_PATTERN = re.compile(r"^\s*([*-]|\d+\.)\s*(\S)", re.MULTILINE)
+EMPHASIS_KEYWORDS = ('important', 'note', 'warning', 'error', 'success')
+
+
+@lru_cache(maxsize=16)
+def _keywords_pattern(keywords: tuple) -> re.Pattern:
+    """Whole-word, case-insensitive alternation of all keywords"""
+    alternation = "|".join(re.escape(keyword) for keyword in keywords)
+    # The lookahead on first letters lets the engine reject most positions
+    # without trying every alternative.
+    first_letters = re.escape("".join(sorted({k[0].lower() for k in keywords} | {k[0].upper() for k in keywords})))
+    return re.compile(r"\b(?=[" + first_letters + r"])(" + alternation + r")\b", re.IGNORECASE)
+
 
 class ResponseFormatter:
     """Applies markdown formatting to AI responses based on a set of rules."""
@@ -10,7 +28,8 @@ class ResponseFormatter:
         The order of operations is important to avoid conflicting rules.
         """
         # Isolate code blocks to prevent them from being altered by other formatters.
-        parts = re.split(r"(```.*?```)", raw_content, flags=re.DOTALL)
+        # Most replies have none, so skip the regex split when there is no fence.
+        parts = CODE_BLOCK_PATTERN.split(raw_content) if "```" in raw_content else [raw_content]
         formatted_parts = []
 
         for i, part in enumerate(parts):
@@ -20,30 +39,66 @@ class ResponseFormatter:
                 continue
 
             # Otherwise, apply formatting rules to the non-code part.
-            formatted_part = part
-            
-            if format_rules.get('use_headers'):
-                formatted_part = self._enhance_headers(formatted_part)
-            
-            if format_rules.get('use_lists'):
-                formatted_part = self._format_lists(formatted_part)
-            
-            if format_rules.get('use_bold') == 'moderate':
-                # Emphasize keywords in non-code text
-                formatted_part = self._emphasize_keywords(
-                    formatted_part, 
-                    ['important', 'note', 'warning', 'error', 'success']
-                )
-
-            formatted_parts.append(formatted_part)
+            formatted_parts.append(self._apply_rules(part, format_rules))
 
         return "".join(formatted_parts)
 
+    async def format_stream(self, chunks: AsyncIterator[str], format_rules: Dict) -> AsyncIterator[str]:
+        """
+        Format a streamed response incrementally.
+        Each line is formatted once, as soon as its newline arrives, instead of
+        reformatting the accumulated text on every chunk. Lines inside ``` fences
+        are passed through unchanged.
+        """
+        pending: List[str] = []
+        in_code_block = False
+
+        async for chunk in chunks:
+            # Only the new chunk is scanned; the partial line is joined once
+            # its newline arrives, so long newline-free output stays linear.
+            if "\n" not in chunk:
+                pending.append(chunk)
+                continue
+            head, _, tail = chunk.rpartition("\n")
+            pending.append(head)
+            complete = "".join(pending)
+            pending = [tail] if tail else []
+            lines = []
+            for line in complete.split("\n"):
+                if line.lstrip().startswith("```"):
+                    in_code_block = not in_code_block
+                    lines.append(line)
+                elif in_code_block:
+                    lines.append(line)
+                else:
+                    lines.append(self._apply_rules(line, format_rules))
+            yield "\n".join(lines) + "\n"
+
+        if pending:
+            rest = "".join(pending)
+            yield rest if in_code_block else self._apply_rules(rest, format_rules)
+
+    def _apply_rules(self, content: str, format_rules: Dict) -> str:
+        """Apply the enabled formatting rules to text outside code blocks."""
+        if format_rules.get('use_headers'):
+            content = self._enhance_headers(content)
+
+        if format_rules.get('use_lists'):
+            content = self._format_lists(content)
+
+        if format_rules.get('use_bold') == 'moderate':
+            # Emphasize keywords in non-code text
+            content = self._emphasize_keywords(content, EMPHASIS_KEYWORDS)
+
+        return content
+
     def _enhance_headers(self, content: str) -> str:
         """
         Ensures proper markdown header hierarchy.
         This heuristic converts short, title-cased lines ending with a colon into headers.
         """
+        if ':' not in content:
+            return content
         lines = content.split('\n')
         formatted_lines = []
         for line in lines:
@@ -66,19 +121,20 @@ class ResponseFormatter:
         Formats bullet points and numbered lists for consistency.
         Ensures there is a space after the list marker.
         """
-        # For bulleted lists (* or -)
-        content = re.sub(r"^\s*([*-])\s*(\S)", r"\1 \2", content, flags=re.MULTILINE)
-        # For numbered lists (1., 2., etc.)
-        content = re.sub(r"^\s*(\d+\.)\s*(\S)", r"\1 \2", content, flags=re.MULTILINE)
-        return content
+        # Every list marker contains one of these; plain prose skips the regex.
+        if '-' not in content and '*' not in content and '.' not in content:
+            return content
+        return LIST_ITEM_PATTERN.sub(r"\1 \2", content)
 
-    def _emphasize_keywords(self, content: str, keywords: List[str]) -> str:
+    def _emphasize_keywords(self, content: str, keywords: Sequence[str]) -> str:
         """
         Wraps specific keywords in bold markdown (`**keyword**`) for emphasis.
         Uses word boundaries to avoid matching substrings inside other words.
         """
-        for keyword in keywords:
-            # \b ensures we match whole words only.
-            # re.IGNORECASE makes the match case-insensitive.
-            content = re.sub(r"\b(" + re.escape(keyword) + r")\b", r"**\1**", content, flags=re.IGNORECASE)
-        return content
+        # Substring checks on the lowered text are far cheaper than the regex
+        # scan, so replies without any keyword skip it entirely.
+        lowered = content.lower()
+        if not any(keyword.lower() in lowered for keyword in keywords):
+            return content
+        # \b ensures we match whole words only; one pass covers every keyword.
+        return _keywords_pattern(tuple(keywords)).sub(r"**\1**", content)
@@ -0,0 +1,168 @@
+"""
+Tests for the /ai router when Claude is not configured
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import utils.ai_endpoints as ai_endpoints
+from utils.ai_endpoints import ai_router
+from utils.claude_client import ClaudeClient
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Test client with a disabled Claude client"""
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    disabled = ClaudeClient()
+    monkeypatch.setattr(ai_endpoints, "get_claude_client", lambda: disabled)
+
+    app = FastAPI()
+    app.include_router(ai_router)
+    return TestClient(app)
+
+
+def test_moderate_fails_open_when_disabled(client):
+    """Moderation returns the precomputed fail-open payload"""
+    response = client.post("/ai/moderate", json={"content": "hello"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == {"is_safe": True, "reason": "Moderation disabled", "confidence": 0.0}
+
+
+def test_detect_spam_when_disabled(client):
+    """Spam detection reports not-spam when disabled"""
+    response = client.post("/ai/detect-spam", json={"content": "hello"})
+    assert response.status_code == 200
+    assert response.json() == {"is_spam": False, "confidence": 0.0}
+
+
+def test_moderate_still_validates_input(client):
+    """Request bodies are still validated by Pydantic"""
+    response = client.post("/ai/moderate", json={})
+    assert response.status_code == 422
+
+
+def test_health_when_disabled(client):
+    """Health check reports AI features as unavailable"""
+    response = client.get("/ai/health")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["ai_enabled"] is False
+    assert data["model"] is None
+    assert data["features"] == []
+
+
+@pytest.fixture
+def enabled_client(monkeypatch):
+    """Test client with a Claude client whose API call is stubbed out"""
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+
+    async def fake_generate_response(prompt, **kwargs):
+        return "hello there world"
+
+    monkeypatch.setattr(claude, "generate_response", fake_generate_response)
+    monkeypatch.setattr(ai_endpoints, "get_claude_client", lambda: claude)
+
+    app = FastAPI()
+    app.include_router(ai_router)
+    return TestClient(app)
+
+
+def test_generate_omits_debug_info_by_default(enabled_client):
+    """Diagnostics are not computed unless requested"""
+    response = enabled_client.post("/ai/generate", json={"prompt": "hi"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["response"] == "hello there world"
+    assert "debug_info" not in data
+
+
+def test_generate_debug_info_opt_in(enabled_client):
+    """?debug=true adds response diagnostics"""
+    response = enabled_client.post("/ai/generate?debug=true", json={"prompt": "hi"})
+    assert response.status_code == 200
+    assert response.json()["debug_info"] == {
+        "response_length": 17,
+        "has_spaces": True,
+        "space_count": 2,
+        "word_count": 3
+    }
+
+
+def test_generate_stream_emits_sse_frames(monkeypatch):
+    """Streamed chunks are framed as SSE content events plus a done event"""
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+
+    async def fake_stream_response(prompt, **kwargs):
+        for chunk in ("Hel", "lo"):
+            yield chunk
+
+    monkeypatch.setattr(claude, "stream_response", fake_stream_response)
+    monkeypatch.setattr(ai_endpoints, "get_claude_client", lambda: claude)
+    app = FastAPI()
+    app.include_router(ai_router)
+
+    response = TestClient(app).post("/ai/generate/stream", json={"prompt": "hi"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    frames = [line[len("data: "):] for line in response.text.split("\n\n") if line]
+    events = [json.loads(frame) for frame in frames]
+    assert [e["text"] for e in events if e["type"] == "content"] == ["Hel", "lo"]
+    assert events[-1]["type"] == "done"
+
+
+def test_moderate_rejects_malformed_json(client):
+    """Bodies that are not JSON are rejected with 400"""
+    response = client.post(
+        "/ai/moderate",
+        content=b"{not json",
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 400
+
+
+def test_moderate_rejects_wrong_type(client):
+    """A non-string content field fails validation"""
+    response = client.post("/ai/detect-spam", json={"content": 42})
+    assert response.status_code == 422
+
+
+def test_moderation_schema_is_documented(client):
+    """The msgspec-backed endpoints still publish their request schema"""
+    schema = client.get("/openapi.json").json()
+    body = schema["paths"]["/ai/moderate"]["post"]["requestBody"]
+    assert body["content"]["application/json"]["schema"]["required"] == ["content"]
+
+
+def test_health_payload_is_reused_within_window(enabled_client, monkeypatch):
+    """Repeated probes within the cache window reuse the serialized body"""
+    now = [1000.0]
+    monkeypatch.setattr(ai_endpoints.time, "monotonic", lambda: now[0])
+    claude = ai_endpoints.get_claude_client()
+    calls = []
+    original = claude.get_model_info
+
+    def counting_model_info():
+        calls.append(1)
+        return original()
+
+    monkeypatch.setattr(claude, "get_model_info", counting_model_info)
+
+    first = enabled_client.get("/ai/health").json()
+    enabled_client.get("/ai/health")
+    assert first["ai_enabled"] is True
+    assert "smart_replies" in first["features"]
+    assert len(calls) == 1
+
+    now[0] += ai_endpoints.HEALTH_CACHE_SECONDS
+    enabled_client.get("/ai/health")
+    assert len(calls) == 2
@@ -0,0 +1,194 @@
+"""
+Tests for the in-process caching utilities
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+from utils import cache as cache_module
+from utils.cache import LRUCache, cached, make_cache_key
+from utils import redis_cache as redis_cache_module
+from utils.redis_cache import AsyncRedisCache
+
+
+def test_get_and_set():
+    """Stored values are returned until deleted"""
+    cache = LRUCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    cache.delete("a")
+    assert cache.get("a") is None
+    assert cache.size() == 0
+
+
+def test_evicts_least_recently_used():
+    """The least recently used key is evicted when full"""
+    cache = LRUCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    """Entries older than the TTL are treated as missing"""
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = LRUCache(max_size=10, ttl=5)
+    cache.set("a", 1)
+    now[0] += 4
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.size() == 0
+
+
+def test_periodic_sweep_removes_stale_entries(monkeypatch):
+    """Expired entries are purged by writes without being looked up"""
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = LRUCache(max_size=1000, ttl=5)
+    for i in range(LRUCache.SWEEP_INTERVAL - 1):
+        cache.set(f"old:{i}", i)
+    now[0] += 10
+    cache.set("fresh", 1)
+    assert cache.size() == 1
+    assert cache.get("fresh") == 1
+
+
+def test_concurrent_access():
+    """Concurrent writers never exceed max_size or raise"""
+    cache = LRUCache(max_size=50, ttl=60)
+
+    def worker(offset):
+        for i in range(500):
+            cache.set(f"{offset}:{i}", i)
+            cache.get(f"{offset}:{i - 1}")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert cache.size() == 50
+
+
+def test_cached_decorator():
+    """Decorated functions are only evaluated once per argument set"""
+    calls = []
+
+    @cached(ttl=60)
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert square(3) == 9
+    assert square(3) == 9
+    assert square(4) == 16
+    assert calls == [3, 4]
+
+    square.clear_cache()
+    assert square(3) == 9
+    assert calls == [3, 4, 3]
+
+
+def test_cache_key_ignores_kwarg_order():
+    """Keyword argument order does not change the cache key"""
+    assert make_cache_key((1, [2, 3]), {"a": 1, "b": 2}) == make_cache_key((1, [2, 3]), {"b": 2, "a": 1})
+    assert make_cache_key((1,), {}) != make_cache_key((2,), {})
+
+
+def test_cache_key_distinguishes_types():
+    """Tuples and lists, and big and small ints, never share a key"""
+    assert make_cache_key(((1, 2),), {}) != make_cache_key(([1, 2],), {})
+    assert make_cache_key((2 ** 70,), {}) != make_cache_key((2 ** 70 + 1,), {})
+    assert make_cache_key((True,), {}) != make_cache_key((1,), {})
+    assert make_cache_key(({1: "a", "1": "b"},), {}) == make_cache_key(({"1": "b", 1: "a"},), {})
+
+
+def test_cached_skips_objects_without_stable_key():
+    """Objects using the default repr (a memory address) are never cached"""
+    calls = []
+
+    @cached(ttl=60)
+    def ident(obj):
+        calls.append(obj)
+        return obj
+
+    marker = object()
+    assert make_cache_key((marker,), {}) is None
+    ident(marker)
+    ident(marker)
+    assert len(calls) == 2
+
+
+def test_cached_decorator_with_unserializable_args():
+    """Objects orjson cannot encode fall back to repr for the key"""
+    class Point:
+        def __init__(self, x):
+            self.x = x
+
+        def __repr__(self):
+            return f"Point({self.x})"
+
+    @cached(ttl=60)
+    def get_x(point):
+        return point.x
+
+    assert get_x(Point(1)) == 1
+    assert get_x(Point(2)) == 2
+
+
+class FakeRedis:
+    """Minimal async stand-in for redis.asyncio.Redis"""
+
+    def __init__(self, fail=False):
+        self.store = {}
+        self.fail = fail
+
+    async def get(self, key):
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.store[key] = value
+
+    async def delete(self, key):
+        self.store.pop(key, None)
+
+
+async def test_redis_cache_round_trip():
+    """Values are namespaced and serialized into Redis"""
+    redis = FakeRedis()
+    cache = AsyncRedisCache("spam", ttl=60, redis_client=redis)
+    await cache.set("abc", {"is_spam": True})
+
+    assert redis.store == {"spam:abc": b'{"is_spam":true}'}
+    assert await cache.get("abc") == {"is_spam": True}
+    await cache.delete("abc")
+    assert await cache.get("abc") is None
+
+
+async def test_redis_cache_falls_back_to_local_on_error():
+    """Redis failures degrade to the in-process cache"""
+    cache = AsyncRedisCache("spam", ttl=60, redis_client=FakeRedis(fail=True))
+    await cache.set("abc", False)
+    assert await cache.get("abc") is False
+    assert cache.local.size() == 1
+
+
+async def test_redis_cache_without_redis(monkeypatch):
+    """Without REDIS_URL the cache is process-local"""
+    monkeypatch.setattr(redis_cache_module, "_redis_client", None)
+    monkeypatch.setattr(redis_cache_module, "_redis_resolved", True)
+    cache = AsyncRedisCache("room", ttl=60)
+    await cache.set("r1", {"name": "general"})
+    assert await cache.get("r1") == {"name": "general"}
@@ -0,0 +1,791 @@
+"""
+Offline tests for ClaudeClient helpers (no API calls)
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import httpx
+import pytest
+from utils import claude_client as claude_module
+from utils.cache import LRUCache
+from utils.redis_cache import AsyncRedisCache
+from utils.claude_client import ClaudeClient
+
+
+@pytest.fixture(autouse=True)
+def fresh_message_cache(monkeypatch):
+    """Isolate cached moderation verdicts and search results between tests"""
+    monkeypatch.setattr(claude_module, "shared_message_cache", AsyncRedisCache("test", max_size=10, ttl=60))
+    monkeypatch.setattr(claude_module, "search_cache", LRUCache(max_size=10, ttl=60))
+
+
+@pytest.fixture
+def claude(monkeypatch):
+    """Disabled client (no API keys)"""
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    return ClaudeClient()
+
+
+def test_date_context_is_cached_per_minute(claude, monkeypatch):
+    """The date context is reused within a minute and refreshed after"""
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(claude_module.time, "time", lambda: now[0])
+
+    first = claude._get_current_date_context()
+    now[0] += 1
+    assert claude._get_current_date_context() is first
+
+    now[0] += 60
+    second = claude._get_current_date_context()
+    assert second.startswith("The current date and time is ")
+    assert second != first
+
+
+async def test_cached_system_block_survives_minute_rollover(claude, monkeypatch):
+    """Only the uncached date block changes when the minute rolls over"""
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(claude_module.time, "time", lambda: now[0])
+    first, _, _ = await claude._prepare_request("hi", "Be brief.", None, False)
+    now[0] += 60
+    second, _, _ = await claude._prepare_request("hey", "Be brief.", None, False)
+
+    assert first[0] == second[0] == {
+        "type": "text", "text": "Be brief.", "cache_control": {"type": "ephemeral"}
+    }
+    assert first[1]["text"].startswith("The current date and time is ")
+    assert first[1] != second[1] and "cache_control" not in second[1]
+
+    default, _, _ = await claude._prepare_request("hi", None, None, False)
+    assert default[0]["text"] == claude_module.DEFAULT_ASSISTANT_PROMPT
+
+
+async def test_micro_batcher_coalesces_concurrent_submissions():
+    """Concurrent submissions are processed as a single batch"""
+    batches = []
+
+    async def process(items):
+        batches.append(items)
+        return [item * 2 for item in items]
+
+    batcher = claude_module.MicroBatcher(process, max_batch_size=16, max_wait_ms=10)
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    assert results == [0, 2, 4, 6, 8]
+    assert batches == [[0, 1, 2, 3, 4]]
+
+
+async def test_micro_batcher_flushes_when_full():
+    """A full batch is dispatched without waiting for the timer"""
+    batches = []
+
+    async def process(items):
+        batches.append(items)
+        return items
+
+    batcher = claude_module.MicroBatcher(process, max_batch_size=2, max_wait_ms=10_000)
+    results = await asyncio.wait_for(
+        asyncio.gather(*(batcher.submit(i) for i in range(4))),
+        timeout=1
+    )
+
+    assert results == [0, 1, 2, 3]
+    assert batches == [[0, 1], [2, 3]]
+
+
+async def test_micro_batcher_propagates_errors():
+    """A failing batch raises in every caller"""
+    async def process(items):
+        raise ValueError("boom")
+
+    batcher = claude_module.MicroBatcher(process, max_wait_ms=1)
+    with pytest.raises(ValueError):
+        await batcher.submit("x")
+
+
+async def test_moderation_batches_concurrent_messages(monkeypatch):
+    """Concurrent moderation requests share one Claude call"""
+    monkeypatch.setenv("STRICT_MODERATION", "true")
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+    prompts = []
+
+    async def fake_generate_raw(prompt, **kwargs):
+        prompts.append(prompt)
+        if prompt.startswith("Message to moderate:"):
+            return '{"is_safe": false, "reason": "checked alone", "confidence": 0.7}'
+        return (
+            '[{"idx": 1, "is_safe": true, "reason": "ok", "confidence": 0.9},'
+            ' {"idx": 2, "is_safe": false, "reason": "Spam link", "confidence": 0.8}]'
+        )
+
+    monkeypatch.setattr(claude, "_generate_raw", fake_generate_raw)
+    first, second, third = await asyncio.gather(
+        claude.moderate_content("hello"),
+        claude.detect_spam("buy now"),
+        claude.moderate_content("third\n2. hello"),
+    )
+
+    batch = json.loads(prompts[0].split("\n", 1)[1])
+    assert batch == [
+        {"idx": 1, "text": "hello"},
+        {"idx": 2, "text": "buy now"},
+        {"idx": 3, "text": "third\n2. hello"},
+    ]
+    assert first == {"is_safe": True, "reason": "ok", "confidence": 0.9}
+    assert second is True
+    # A message missing from the batch answer is re-moderated, not passed
+    assert prompts[1:] == ["Message to moderate: third\n2. hello"]
+    assert third == {"is_safe": False, "reason": "checked alone", "confidence": 0.7}
+
+
+async def test_unparseable_batch_falls_back_to_single_messages(monkeypatch):
+    """A garbled batch answer is retried message by message"""
+    monkeypatch.setenv("STRICT_MODERATION", "true")
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+    prompts = []
+
+    async def fake_generate_raw(prompt, **kwargs):
+        prompts.append(prompt)
+        if prompt.startswith("Messages to moderate"):
+            return "Sorry, I cannot produce JSON right now."
+        return '{"is_safe": true, "reason": "ok", "confidence": 0.8}'
+
+    monkeypatch.setattr(claude, "_generate_raw", fake_generate_raw)
+    results = await asyncio.gather(claude.moderate_content("one"), claude.moderate_content("two"))
+
+    assert [r["reason"] for r in results] == ["ok", "ok"]
+    assert sorted(prompts[1:]) == ["Message to moderate: one", "Message to moderate: two"]
+
+
+async def test_moderation_fails_open_on_bad_response(monkeypatch):
+    """Unparseable model output fails open"""
+    monkeypatch.setenv("STRICT_MODERATION", "true")
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+
+    async def fake_generate_raw(prompt, **kwargs):
+        return "not json"
+
+    monkeypatch.setattr(claude, "_generate_raw", fake_generate_raw)
+    result = await claude.moderate_content("hello")
+
+    assert result["is_safe"] is True
+    assert result["reason"].startswith("Moderation error:")
+
+
+async def test_moderation_normalizes_single_verdicts(monkeypatch):
+    """A non-object reply fails open uncached; partial verdicts get defaults"""
+    monkeypatch.setenv("STRICT_MODERATION", "true")
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+    replies = ['[{"is_safe": false, "reason": "Spam"}]', '{"is_safe": false}']
+
+    async def fake_generate_raw(prompt, **kwargs):
+        return replies.pop(0)
+
+    monkeypatch.setattr(claude, "_generate_raw", fake_generate_raw)
+
+    result = await claude.moderate_content("buy now")
+    assert result["is_safe"] is True
+    assert result["reason"].startswith("Moderation error:")
+    assert await claude.moderate_content("buy now") == {"is_safe": False, "reason": "", "confidence": 0.0}
+
+
+async def test_moderation_sends_only_the_moderation_prompt(monkeypatch):
+    """Moderation skips the date context and conversation plumbing"""
+    monkeypatch.setenv("STRICT_MODERATION", "true")
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+    calls = []
+
+    class FakeMessages:
+        async def create(self, **kwargs):
+            calls.append(kwargs)
+            block = type("Block", (), {"text": '{"is_safe": true, "reason": "ok", "confidence": 1.0}'})
+            return type("Message", (), {"content": [block]})
+
+    monkeypatch.setattr(claude.client, "messages", FakeMessages())
+    assert (await claude.moderate_content("hello"))["reason"] == "ok"
+    assert calls[0]["system"] == claude_module.MODERATION_SYSTEM_PROMPT
+    assert calls[0]["messages"] == [{"role": "user", "content": "Message to moderate: hello"}]
+    assert claude.conversations == {}
+
+
+async def test_token_bucket_allows_burst_then_waits(monkeypatch):
+    """Requests beyond the per-minute budget wait for refill"""
+    now = [100.0]
+    sleeps = []
+    monkeypatch.setattr(claude_module.time, "monotonic", lambda: now[0])
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(claude_module.asyncio, "sleep", fake_sleep)
+    limiter = claude_module.TokenBucketLimiter(rpm=2, tpm=1000, concurrency=5)
+
+    await limiter.acquire(100)
+    await limiter.acquire(100)
+    assert sleeps == []
+
+    await limiter.acquire(100)
+    assert sleeps and sum(sleeps) == pytest.approx(30.0, rel=0.01)
+
+
+async def test_token_bucket_charges_token_cost(monkeypatch):
+    """Large prompts consume the token budget, not just one request"""
+    now = [100.0]
+    sleeps = []
+    monkeypatch.setattr(claude_module.time, "monotonic", lambda: now[0])
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(claude_module.asyncio, "sleep", fake_sleep)
+    limiter = claude_module.TokenBucketLimiter(rpm=100, tpm=600, concurrency=5)
+
+    await limiter.acquire(600)
+    await limiter.acquire(300)
+    assert sum(sleeps) == pytest.approx(30.0, rel=0.01)
+
+
+async def test_token_bucket_settles_actual_usage(monkeypatch):
+    """Reported usage refunds over-estimates and charges under-estimates"""
+    monkeypatch.setattr(claude_module.time, "monotonic", lambda: 100.0)
+    limiter = claude_module.TokenBucketLimiter(rpm=100, tpm=1000, concurrency=5)
+
+    await limiter.acquire(800)
+    limiter.settle(800, 200)
+    assert limiter._tokens == pytest.approx(800)
+
+    limiter.settle(0, 900)
+    assert limiter._tokens == pytest.approx(-100)
+
+
+async def test_create_message_estimates_full_request(monkeypatch):
+    """The limiter is charged for system prompt and history, then settled"""
+    from types import SimpleNamespace as NS
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+    costs, settled = [], []
+
+    async def fake_acquire(cost):
+        costs.append(cost)
+
+    monkeypatch.setattr(claude.rate_limiter, "acquire", fake_acquire)
+    monkeypatch.setattr(claude.rate_limiter, "settle", lambda est, actual: settled.append((est, actual)))
+
+    class FakeMessages:
+        async def create(self, **kwargs):
+            return NS(usage=NS(input_tokens=500, output_tokens=20))
+
+    monkeypatch.setattr(claude.client, "messages", FakeMessages())
+    history = [{"role": "user", "content": "x" * 4000}, {"role": "user", "content": "hi"}]
+    await claude._create_message(model="m", max_tokens=100, system="s" * 400, messages=history)
+
+    assert costs[0] > 1100
+    assert settled == [(costs[0], 520)]
+
+
+async def test_create_message_retries_rate_limit(monkeypatch):
+    """429 responses are retried after the retry-after delay"""
+    import anthropic
+    import httpx
+
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(claude_module.asyncio, "sleep", fake_sleep)
+    response = httpx.Response(
+        429,
+        headers={"retry-after": "2"},
+        request=httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+    )
+    calls = []
+
+    class FakeMessages:
+        async def create(self, **kwargs):
+            calls.append(kwargs)
+            if len(calls) < 3:
+                raise anthropic.RateLimitError("rate limited", response=response, body=None)
+            return "ok"
+
+    monkeypatch.setattr(claude.client, "messages", FakeMessages())
+    assert await claude._create_message(model="m", max_tokens=10, messages=[]) == "ok"
+    assert len(calls) == 3
+    assert len(sleeps) == 2 and all(2.0 <= s <= 3.0 for s in sleeps)
+
+
+async def test_stream_response_saves_history(monkeypatch):
+    """A completed stream is recorded in the conversation history"""
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+
+    async def text_stream():
+        for chunk in ("Hi ", "there"):
+            yield chunk
+
+    class FakeStream:
+        async def __aenter__(self):
+            self.text_stream = text_stream()
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def get_final_message(self):
+            return None
+
+    class FakeMessages:
+        def stream(self, **kwargs):
+            assert kwargs["messages"][-1] == {"role": "user", "content": "hello"}
+            return FakeStream()
+
+    monkeypatch.setattr(claude.client, "messages", FakeMessages())
+    chunks = [c async for c in claude.stream_response("hello", conversation_id="conv")]
+
+    assert chunks == ["Hi ", "there"]
+    assert claude.get_conversation_history("conv") == [
+        {"role": "user", "content": "hello"},
+        {"role": "assistant", "content": "Hi there"},
+    ]
+
+
+def test_parse_model_json_tolerates_prose():
+    """JSON wrapped in prose or cut off mid-string still parses"""
+    parse = claude_module.parse_model_json
+    assert parse('{"is_safe": true}') == {"is_safe": True}
+    assert parse('Here is the JSON:\n{"is_safe": false, "reason": "spam"} Hope this helps!') == {
+        "is_safe": False, "reason": "spam"
+    }
+    assert parse('[{"idx": 1}] done') == [{"idx": 1}]
+    assert parse('{"is_safe": true, "reason": "looks fi') == {"is_safe": True, "reason": "looks fi"}
+    with pytest.raises(ValueError):
+        parse("no json here")
+
+
+async def test_detect_spam_short_circuits_clear_cases(monkeypatch):
+    """Clear-cut messages are decided without calling Claude"""
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+    calls = []
+
+    async def fake_moderate_content(content):
+        calls.append(content)
+        return {"is_safe": False, "reason": "Spam", "confidence": 0.9}
+
+    monkeypatch.setattr(claude, "moderate_content", fake_moderate_content)
+
+    assert await claude.detect_spam("see you tomorrow") is False
+    assert await claude.detect_spam("https://a.com https://b.com www.c.com http://d.com https://e.com") is True
+    assert calls == []
+
+
+async def test_moderation_verdicts_are_cached(monkeypatch):
+    """Repeated content is moderated once; errors are not cached"""
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+    prompts = []
+    replies = [
+        "not json",
+        '{"is_safe": true, "reason": "ok", "confidence": 0.9}',
+        '{"is_safe": false, "reason": "Spam link", "confidence": 0.9}',
+    ]
+
+    async def fake_generate_raw(prompt, **kwargs):
+        prompts.append(prompt)
+        return replies.pop(0)
+
+    monkeypatch.setattr(claude, "_generate_raw", fake_generate_raw)
+
+    assert (await claude.moderate_content("click here"))["reason"].startswith("Moderation error")
+    assert (await claude.moderate_content("click here"))["reason"] == "ok"
+    assert await claude.detect_spam("click here for prizes") is True
+    assert await claude.detect_spam("click here for prizes") is True
+    assert (await claude.moderate_content("click here for prizes"))["reason"] == "Spam link"
+    assert len(prompts) == 3
+
+
+async def test_prefilter_skips_claude_for_trivial_messages(monkeypatch):
+    """Known-benign phrases are passed locally unless moderation is strict"""
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+    calls = []
+
+    async def fake_generate_raw(prompt, **kwargs):
+        calls.append(prompt)
+        return '{"is_safe": true, "reason": "ok", "confidence": 0.9}'
+
+    monkeypatch.setattr(claude, "_generate_raw", fake_generate_raw)
+
+    assert await claude.moderate_content("See you!") == {
+        "is_safe": True, "reason": "prefilter", "confidence": 0.5
+    }
+    assert calls == []
+
+    assert (await claude.moderate_content("I will kill you"))["reason"] == "ok"
+    assert len(calls) == 1
+
+    claude.strict_moderation = True
+    assert (await claude.moderate_content("See you!"))["reason"] == "ok"
+    assert len(calls) == 2
+
+
+def test_client_uses_explicit_timeouts(monkeypatch):
+    """The SDK client fails fast on connect instead of the 10 minute default"""
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+    assert claude.client.timeout.connect == claude_module.CLAUDE_CONNECT_TIMEOUT_SECONDS
+    assert claude.client.timeout.read == claude_module.CLAUDE_TIMEOUT_SECONDS
+
+
+def test_client_is_async(monkeypatch):
+    """API calls are awaited so they never block the event loop"""
+    import anthropic
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+    assert isinstance(claude.client, anthropic.AsyncAnthropic)
+
+
+async def test_summary_prompt_is_bounded_by_characters(monkeypatch):
+    """Old messages are dropped once the character budget is spent"""
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    monkeypatch.setattr(claude_module, "SUMMARY_MAX_CHARS", 30)
+    claude = ClaudeClient(api_key="test-key")
+    prompts = []
+
+    async def fake_generate_response(prompt, **kwargs):
+        prompts.append(prompt)
+        return "summary"
+
+    monkeypatch.setattr(claude, "generate_response", fake_generate_response)
+    messages = [
+        {"username": "a", "content": "x" * 50},
+        {"username": "b", "content": "hello"},
+        {"username": "c", "content": "bye"},
+    ]
+
+    assert await claude.summarize_conversation(messages) == "summary"
+    assert prompts[0].endswith("\n\nb: hello\nc: bye")
+
+    await claude.summarize_conversation([{"username": "a", "content": "y" * 100}])
+    assert prompts[1].endswith("\n\na: " + "y" * 27)
+
+
+def test_conversation_history_is_bounded(claude, monkeypatch):
+    """Old turns are evicted by message count and by estimated tokens"""
+    monkeypatch.setattr(claude_module, "MAX_HISTORY_MESSAGES", 4)
+    for i in range(5):
+        claude.save_turn("conv", f"q{i}", f"a{i}")
+    assert [m["content"] for m in claude.get_conversation_history("conv")] == ["q3", "a3", "q4", "a4"]
+
+    monkeypatch.setattr(claude_module, "MAX_HISTORY_TOKENS", 10)
+    claude.save_turn("conv", "long question", "long answer")
+    assert claude.get_conversation_history("conv") == [
+        {"role": "user", "content": "long question"},
+        {"role": "assistant", "content": "long answer"},
+    ]
+
+
+async def test_long_history_is_compacted_into_a_summary(monkeypatch):
+    """The older half of a long conversation is replaced by a summary"""
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    monkeypatch.setattr(claude_module, "MAX_HISTORY_TOKENS", 90)
+    claude = ClaudeClient(api_key="test-key")
+    calls = []
+
+    async def fake_generate_raw(prompt, **kwargs):
+        calls.append((prompt, kwargs["model"]))
+        return "they discussed x"
+
+    monkeypatch.setattr(claude, "_generate_raw", fake_generate_raw)
+    for i in range(4):
+        claude.save_turn("conv", f"question {i} " * 2, f"answer {i} " * 2)
+
+    _, messages, _ = await claude._prepare_request("next", None, "conv", False)
+
+    assert calls == [(
+        "user: question 0 question 0 \nassistant: answer 0 answer 0 \n"
+        "user: question 1 question 1 \nassistant: answer 1 answer 1 ",
+        claude_module.SUMMARY_MODEL
+    )]
+    history = claude.get_conversation_history("conv")
+    assert history[0] == {"role": "user", "content": "[Earlier conversation summary]: they discussed x"}
+    assert [m["content"] for m in history[1:]] == [
+        "question 2 question 2 ", "answer 2 answer 2 ", "question 3 question 3 ", "answer 3 answer 3 "
+    ]
+    assert messages[0] == history[0] and messages[-1] == {"role": "user", "content": "next"}
+
+
+async def test_web_search_reuses_pooled_client(monkeypatch):
+    """Every search goes through the one keep-alive client"""
+    claude = ClaudeClient(api_key="test-key", brave_api_key="brave-key")
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"web": {"results": [
+            {"title": "T", "url": "https://example.com", "description": "D"}
+        ]}})
+
+    pooled = httpx.AsyncClient(transport=httpx.MockTransport(handler), headers=claude._http.headers)
+    await claude._http.aclose()
+    claude._http = pooled
+
+    for query in ("first", "second"):
+        results = await claude.search_web(query, count=3)
+        assert results == [{"title": "T", "url": "https://example.com", "description": "D"}]
+    assert [r.url.params["q"] for r in requests] == ["first", "second"]
+    assert all(r.headers["X-Subscription-Token"] == "brave-key" for r in requests)
+
+    await claude.aclose()
+    assert pooled.is_closed
+
+
+async def test_web_search_results_are_cached(monkeypatch):
+    """Repeated short queries are answered from the cache; long ones are not"""
+    monkeypatch.setattr(claude_module, "SEARCH_CACHE_MAX_QUERY_CHARS", 20)
+    claude = ClaudeClient(api_key="test-key", brave_api_key="brave-key")
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"web": {"results": [{"title": "T"}]}})
+
+    await claude._http.aclose()
+    claude._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    await claude.search_web("Latest News ", count=5)
+    assert await claude.search_web("latest news", count=5) == [{"title": "T", "url": "", "description": ""}]
+    assert len(requests) == 1
+
+    await claude.search_web("latest news", count=3)
+    assert len(requests) == 2
+
+    long_query = "what happened " * 3
+    await claude.search_web(long_query)
+    await claude.search_web(long_query)
+    assert len(requests) == 4
+    await claude.aclose()
+
+
+async def test_web_search_overlaps_history_compaction(monkeypatch):
+    """The search request is in flight while the history is being compacted"""
+    claude = ClaudeClient(api_key="test-key", brave_api_key="brave-key")
+    compacting = asyncio.Event()
+
+    async def fake_compact(conversation_id):
+        compacting.set()
+        await asyncio.sleep(0)
+
+    async def fake_search(query, count=5):
+        await compacting.wait()
+        return [{"title": "T", "url": "u", "description": "d"}]
+
+    monkeypatch.setattr(claude, "_compact_history", fake_compact)
+    monkeypatch.setattr(claude, "search_web", fake_search)
+
+    system, messages, results = await asyncio.wait_for(
+        claude._prepare_request("latest scores", None, "conv", True), timeout=1
+    )
+    assert results == [{"title": "T", "url": "u", "description": "d"}]
+    assert "**T**" in system[2]["text"]
+    assert "cache_control" not in system[2]
+    assert messages == [{"role": "user", "content": "latest scores"}]
+    await claude.aclose()
+
+
+def test_search_skipped_for_creative_and_code_requests(claude):
+    """Skip phrases match case-insensitively at word starts only"""
+    assert claude._detect_search_need("Write a poem about rain", []) is None
+    assert claude._detect_search_need("How does TCP work?", []) is None
+    assert claude._detect_search_need("fix this code please", []) is None
+    assert claude._detect_search_need("Who won the match today?", []) == "Who won the match today?"
+    assert claude._detect_search_need("Samsung decompose a phone teardown", []) is not None
+
+
+def test_phrase_trie_pattern_matches_every_phrase():
+    """The trie-factored pattern accepts exactly the phrases it was built from"""
+    pattern = claude_module.re.compile(
+        claude_module._phrase_trie_pattern(("write a", "write a function", "what is"))
+    )
+    for phrase in ("write a", "write a function", "what is"):
+        assert pattern.fullmatch(phrase)
+    assert pattern.fullmatch("write") is None
+    assert pattern.fullmatch("what") is None
+
+
+async def test_prompt_prefix_is_marked_for_caching(claude):
+    """The system prompt and a long history prefix carry cache_control"""
+    system, messages, _ = await claude._prepare_request("hi", None, "conv", False)
+    assert system[0]["cache_control"] == {"type": "ephemeral"}
+    assert messages == [{"role": "user", "content": "hi"}]
+
+    for i in range(2):
+        claude.save_turn("conv", f"q{i}", f"a{i}")
+    _, messages, _ = await claude._prepare_request("next", None, "conv", False)
+    assert messages[-2] == {"role": "assistant", "content": [
+        {"type": "text", "text": "a1", "cache_control": {"type": "ephemeral"}}
+    ]}
+    assert messages[-1] == {"role": "user", "content": "next"}
+    assert claude.get_conversation_history("conv")[-1] == {"role": "assistant", "content": "a1"}
+
+
+async def test_moderate_content_batch_uses_message_batches(monkeypatch):
+    """Bulk moderation submits one batch, polls until it ends and keeps input order"""
+    from types import SimpleNamespace as NS
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    monkeypatch.setattr(claude_module, "MODERATION_BATCH_POLL_SECONDS", 0)
+    claude = ClaudeClient(api_key="test-key")
+    submitted = []
+
+    class FakeBatches:
+        polls = 0
+
+        async def create(self, requests):
+            submitted.extend(requests)
+            return NS(id="batch_1", processing_status="in_progress")
+
+        async def retrieve(self, batch_id):
+            self.polls += 1
+            return NS(id=batch_id, processing_status="ended" if self.polls == 2 else "in_progress")
+
+        async def results(self, batch_id):
+            async def entries():
+                yield NS(custom_id="1", result=NS(type="errored"))
+                text = '{"is_safe": false, "reason": "spam", "confidence": 0.9}'
+                yield NS(custom_id="0", result=NS(type="succeeded", message=NS(content=[NS(text=text)])))
+            return entries()
+
+    batches = FakeBatches()
+    monkeypatch.setattr(claude.client.messages, "batches", batches)
+
+    results = await claude.moderate_content_batch(["buy now", "hello"])
+    assert [r["custom_id"] for r in submitted] == ["0", "1"]
+    assert submitted[0]["params"]["system"] == claude_module.MODERATION_SYSTEM_PROMPT
+    assert batches.polls == 2
+    assert results == [
+        {"is_safe": False, "reason": "spam", "confidence": 0.9},
+        {"is_safe": True, "reason": "Moderation error: errored", "confidence": 0.0}
+    ]
+
+
+def test_message_tokens_are_estimated_locally():
+    """Four characters per token plus a fixed per-message overhead"""
+    estimate = claude_module.estimate_message_tokens
+    assert estimate({"role": "user", "content": ""}) == 5
+    assert estimate({"role": "user", "content": "x" * 400}) == 105
+    assert estimate({"role": "assistant", "content": None}) == 5
+
+
+def test_conversation_store_evicts_least_recently_used():
+    """Idle conversations are dropped first once the store is full"""
+    store = claude_module.ConversationStore(max_size=2)
+    store["a"] = [1]
+    store.setdefault("b", []).append(2)
+    assert store.get("a") == [1]
+    store["c"] = [3]
+
+    assert list(store) == ["a", "c"]
+    assert store.get("b") is None
+    assert store.setdefault("a", []) == [1]
+
+
+async def test_conversation_persists_to_redis_as_msgpack(monkeypatch):
+    """A second worker resumes a conversation saved by the first"""
+    import msgspec
+    store = {}
+
+    class FakeRedis:
+        async def get(self, key):
+            return store.get(key)
+
+        async def set(self, key, value, ex=None):
+            store[key] = value
+
+        async def delete(self, key):
+            store.pop(key, None)
+
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    monkeypatch.setattr(claude_module, "get_redis_client", lambda: FakeRedis())
+    first = ClaudeClient(api_key="test-key")
+    first.save_turn("conv", "hi", "hello")
+    await first.persist_conversation("conv")
+    assert msgspec.msgpack.decode(store["conv:conv"]) == [
+        {"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}
+    ]
+
+    second = ClaudeClient(api_key="test-key")
+    async with second.conversation_turn("conv"):
+        _, messages, _ = await second._prepare_request("again", None, "conv", False)
+    assert [m["content"] for m in messages] == ["hi", "hello", "again"]
+
+    await second.aclear_conversation("conv")
+    assert store == {} and second.get_conversation_count("conv") == 0
+
+
+async def test_stale_worker_reloads_history_from_redis(monkeypatch):
+    """A worker with an old local copy does not overwrite turns saved elsewhere"""
+    store = {}
+
+    class FakeRedis:
+        async def get(self, key):
+            return store.get(key)
+
+        async def set(self, key, value, ex=None):
+            store[key] = value
+
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    monkeypatch.setattr(claude_module, "get_redis_client", lambda: FakeRedis())
+    first = ClaudeClient(api_key="test-key")
+    second = ClaudeClient(api_key="test-key")
+    for worker, turn in ((first, "one"), (second, "two"), (first, "three")):
+        async with worker.conversation_turn("conv"):
+            await worker._prepare_request(turn, None, "conv", False)
+            worker.save_turn("conv", turn, turn.upper())
+            await worker.persist_conversation("conv")
+
+    assert [m["content"] for m in first.get_conversation_history("conv")] == [
+        "one", "ONE", "two", "TWO", "three", "THREE"
+    ]
+
+
+async def test_generate_response_serializes_turns_of_a_conversation(monkeypatch):
+    """Concurrent requests on one conversation each build on the previous reply"""
+    from types import SimpleNamespace
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    claude = ClaudeClient(api_key="test-key")
+    seen = []
+
+    async def fake_create_message(messages, **kwargs):
+        seen.append([m["content"] for m in messages])
+        await asyncio.sleep(0)
+        return SimpleNamespace(content=[SimpleNamespace(text=messages[-1]["content"].upper())])
+
+    monkeypatch.setattr(claude, "_create_message", fake_create_message)
+    await asyncio.gather(
+        claude.generate_response("one", conversation_id="conv", enable_search=False),
+        claude.generate_response("two", conversation_id="conv", enable_search=False),
+    )
+
+    assert seen == [["one"], ["one", "ONE", "two"]]
+    assert [m["content"] for m in claude.get_conversation_history("conv")] == ["one", "ONE", "two", "TWO"]
+
+
+def test_search_skipped_late_in_long_conversations(claude):
+    """Long conversations only search for explicit current-events questions"""
+    history = [{"role": "user", "content": "x"}] * (claude_module.SEARCH_SKIP_HISTORY_MESSAGES + 1)
+    assert claude._detect_search_need("What did you mean by that?", history) is None
+    assert claude._detect_search_need("What's the latest on the election?", history) is not None
+    assert claude._detect_search_need("Who won in 2025?", history) is not None
+    assert claude._detect_search_need("What did you mean by that?", history[:2]) is not None
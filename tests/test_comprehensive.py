@@ -1,6 +1,7 @@
 """
 Comprehensive test suite for FastAPI Video Chat Application
 """
+import json
 import pytest
 import asyncio
 from fastapi.testclient import TestClient
@@ -219,6 +220,19 @@ class TestWebSocket:
             response = websocket.receive_text()
             assert "Hello, World!" in response
     
+    def test_websocket_invalid_message_format(self, client, test_user_data, test_room_data):
+        """JSON frames without content get an error reply; unicode round-trips"""
+        user_id = client.post("/users", json=test_user_data).json()["id"]
+        room_id = client.post("/rooms", json=test_room_data).json()["id"]
+
+        with client.websocket_connect(f"/ws/{room_id}/{user_id}") as websocket:
+            websocket.receive_text()
+            websocket.send_text('[1, 2]')
+            assert json.loads(websocket.receive_text()) == {"type": "error", "message": "Invalid message format"}
+
+            websocket.send_text('{"content": "caf\u00e9 \u2615"}')
+            assert json.loads(websocket.receive_text())["content"] == "caf\u00e9 \u2615"
+
     def test_websocket_invalid_room(self, client, test_user_data):
         """Test WebSocket connection with invalid room"""
         user_response = client.post("/users", json=test_user_data)
@@ -306,6 +320,68 @@ class TestPerformance:
         assert all(r.status_code == 200 for r in responses)
 
 
+# Chat API Tests
+class TestChatPayloads:
+    """Tests for /api/v1/chat payload parsing"""
+
+    def test_chat_invalid_json(self, client):
+        """Malformed JSON is rejected before reaching the AI service"""
+        response = client.post(
+            "/api/v1/chat",
+            content=b'{"message": ',
+            headers={"Content-Type": "application/json"}
+        )
+        assert response.status_code == 400
+
+    def test_chat_non_object_json(self, client):
+        """A JSON array is not a valid chat payload"""
+        response = client.post("/api/v1/chat", json=["hello"])
+        assert response.status_code == 400
+
+    def test_chat_missing_message(self, client):
+        """Payload without any message field is rejected"""
+        response = client.post("/api/v1/chat", json={"conversation_id": "abc"})
+        assert response.status_code == 422
+
+    def test_chat_stream_invalid_json(self, client):
+        """The streaming endpoint shares the payload parsing of /chat"""
+        response = client.post(
+            "/api/v1/chat/stream",
+            content=b'{"message": ',
+            headers={"Content-Type": "application/json"}
+        )
+        assert response.status_code == 400
+
+    def test_chat_stream_emits_sse_frames(self, client):
+        """Formatted chunks are streamed as content frames plus a done frame"""
+        from api.routes.chat import get_ai_service
+
+        class FakeClaude:
+            is_enabled = True
+
+            def get_conversation_count(self, conversation_id):
+                return 2
+
+        class FakeService:
+            claude_client = FakeClaude()
+
+            async def stream_response(self, user_input, history, conversation_id=None):
+                for chunk in ("Hello ", "there"):
+                    yield chunk
+
+        client.app.dependency_overrides[get_ai_service] = lambda: FakeService()
+        try:
+            response = client.post("/api/v1/chat/stream", json={"message": "hi", "conversation_id": "c1"})
+        finally:
+            client.app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [json.loads(frame[len("data: "):]) for frame in response.text.split("\n\n") if frame]
+        assert [e["text"] for e in events if e["type"] == "content"] == ["Hello ", "there"]
+        assert events[-1] == {"type": "done", "conversation_id": "c1", "conversation_length": 2}
+
+
 # Integration Tests
 class TestIntegration:
     """Full workflow integration tests"""
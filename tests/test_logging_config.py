@@ -0,0 +1,104 @@
+"""
+Tests for the structured logging helpers
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import logging
+from utils.logging_config import ColoredFormatter, ContextLogger, JSONFormatter, setup_logging, stop_file_logging
+
+
+def _record(msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord("fastapi_video_chat", logging.INFO, __file__, 10, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_json_formatter_output():
+    """Records are rendered as one JSON object with a UTC timestamp"""
+    data = json.loads(JSONFormatter().format(_record()))
+    assert data["message"] == "hello world"
+    assert data["level"] == "INFO"
+    assert data["logger"] == "fastapi_video_chat"
+    assert data["line"] == 10
+    assert data["timestamp"].endswith("Z")
+
+
+def test_json_formatter_merges_extra_fields():
+    """Context passed as extra={"extra": {...}} is merged into the payload"""
+    data = json.loads(JSONFormatter().format(_record(extra={"room_id": "r1", "obj": object()})))
+    assert data["room_id"] == "r1"
+    assert data["obj"].startswith("<object object")
+
+
+def test_timestamp_uses_record_time():
+    """The timestamp reflects when the record was created, in UTC"""
+    record = _record()
+    record.created = 1700000000.25
+    assert json.loads(JSONFormatter().format(record))["timestamp"] == "2023-11-14T22:13:20.250000Z"
+    record.created = 1700000001.5
+    assert json.loads(JSONFormatter().format(record))["timestamp"] == "2023-11-14T22:13:21.500000Z"
+
+
+def test_context_logger_skips_disabled_levels(monkeypatch):
+    """Disabled levels return before the context dict is built"""
+    logger = logging.getLogger("test_context_logger")
+    logger.setLevel(logging.INFO)
+    records = []
+    monkeypatch.setattr(logger, "handle", records.append)
+    context_logger = ContextLogger(logger)
+    context_logger.set_context(room_id="r1")
+
+    context_logger.debug("hidden %s", "value")
+    context_logger.info("joined %s", "alice", user_id="u1")
+
+    assert len(records) == 1
+    assert records[0].getMessage() == "joined alice"
+    assert records[0].extra == {"room_id": "r1", "user_id": "u1"}
+
+
+def test_context_logger_without_context(monkeypatch):
+    """Records without context or fields carry no extra payload"""
+    logger = logging.getLogger("test_context_logger_empty")
+    logger.setLevel(logging.INFO)
+    records = []
+    monkeypatch.setattr(logger, "handle", records.append)
+    context_logger = ContextLogger(logger)
+
+    context_logger.info("plain")
+    context_logger.info("with field", user_id="u1")
+
+    assert not hasattr(records[0], "extra")
+    assert records[1].extra == {"user_id": "u1"}
+    assert json.loads(JSONFormatter().format(records[0]))["message"] == "plain"
+
+
+def test_file_logging_is_written_by_listener(tmp_path):
+    """File records go through the queue and keep exception details"""
+    log_file = tmp_path / "app.log"
+    logger = setup_logging(level="INFO", json_logs=True, log_file=str(log_file))
+    try:
+        logger.info("saved %s", "room")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+    finally:
+        stop_file_logging()
+        logger.handlers.clear()
+
+    lines = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [line["message"] for line in lines] == ["saved room", "failed"]
+    assert "ValueError: boom" in lines[1]["exception"]
+
+
+def test_colored_formatter_leaves_record_unchanged():
+    """Coloring the level does not leak into other handlers' output"""
+    record = _record()
+    formatted = ColoredFormatter("%(levelname)s %(message)s").format(record)
+    assert formatted == "\033[32mINFO\033[0m hello world"
+    assert record.levelname == "INFO"
+    assert json.loads(JSONFormatter().format(record))["level"] == "INFO"
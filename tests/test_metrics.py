@@ -0,0 +1,94 @@
+"""
+Tests for the metrics collector
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import pytest
+from utils import metrics as metrics_module
+from utils.metrics import Metrics, MetricsCollector, timed_endpoint
+
+
+def test_average_over_recent_window(monkeypatch):
+    """Only the most recent durations contribute to the average"""
+    monkeypatch.setattr(metrics_module, "MAX_REQUEST_DURATIONS", 3)
+    metrics = Metrics()
+    for duration in (100.0, 1.0, 2.0, 3.0):
+        metrics.add_request_duration(duration)
+    assert list(metrics.request_durations) == [1.0, 2.0, 3.0]
+    assert metrics.average_request_duration() == pytest.approx(2.0)
+
+
+def test_reset_clears_durations():
+    """Reset empties the window and its running sum"""
+    metrics = Metrics()
+    metrics.add_request_duration(5.0)
+    metrics.reset()
+    assert metrics.average_request_duration() == 0.0
+    metrics.add_request_duration(1.0)
+    assert metrics.average_request_duration() == pytest.approx(1.0)
+
+
+def test_percentiles_interpolate_between_ranks():
+    """Percentiles match numpy's default linear interpolation"""
+    metrics = Metrics()
+    for duration in range(1, 101):
+        metrics.add_request_duration(float(duration))
+    assert metrics.percentiles((0, 50, 95, 100)) == pytest.approx(
+        {0: 1.0, 50: 50.5, 95: 95.05, 100: 100.0}
+    )
+    assert metrics.to_dict()["requests"]["p99_duration_ms"] == "99.01"
+
+
+def test_percentiles_empty():
+    """No samples report zero rather than failing"""
+    assert Metrics().percentiles() == {50: 0.0, 95: 0.0, 99: 0.0}
+
+
+def test_collector_counts_concurrent_updates():
+    """Updates from many threads are neither lost nor break reads"""
+    collector = MetricsCollector()
+    collector.reset()
+
+    def worker():
+        for i in range(2000):
+            collector.record_request(1.0, success=i % 2 == 0)
+            collector.record_error("ValueError")
+            collector.get_metrics()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    requests = collector.get_metrics()["requests"]
+    assert requests["total"] == 8000
+    assert requests["successful"] == requests["failed"] == 4000
+    assert collector.metrics.error_count["ValueError"] == 8000
+    collector.reset()
+
+
+async def test_timed_endpoint_records_outcome():
+    """Timed endpoints record one request per call, with the error type on failure"""
+    collector = MetricsCollector()
+    collector.reset()
+
+    @timed_endpoint
+    async def endpoint(value: int):
+        """Endpoint docstring"""
+        if value < 0:
+            raise ValueError("negative")
+        return value
+
+    assert endpoint.__name__ == "endpoint"
+    assert await endpoint(1) == 1
+    with pytest.raises(ValueError):
+        await endpoint(-1)
+
+    requests = collector.get_metrics()["requests"]
+    assert (requests["total"], requests["successful"], requests["failed"]) == (2, 1, 1)
+    assert dict(collector.metrics.error_count) == {"ValueError": 1}
+    collector.reset()
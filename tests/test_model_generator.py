@@ -0,0 +1,130 @@
+"""
+Tests for the prompt-driven primitive model generator
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+trimesh = pytest.importorskip("trimesh")
+
+from utils import model_generator
+from utils.model_generator import generate_model_from_prompt, generate_simple_sphere
+
+
+def test_cached_primitives_are_independent_copies():
+    """Mutating a generated primitive never leaks into later calls"""
+    first = generate_simple_sphere()
+    first.apply_translation([5, 0, 0])
+    second = generate_simple_sphere()
+    assert second.bounds[0][0] == pytest.approx(-1.0)
+    assert model_generator._sphere_template.cache_info().hits >= 1
+
+
+def test_generate_model_writes_glb(tmp_path):
+    """A prompt produces a loadable GLB file at the requested path"""
+    output = tmp_path / "models" / "table.glb"
+    assert generate_model_from_prompt("a red table", str(output)) == str(output)
+    scene = trimesh.load(str(output))
+    assert len(scene.geometry) == 1
+    mesh = next(iter(scene.geometry.values()))
+    assert mesh.bounds[1][2] == pytest.approx(0.8)
+    assert mesh.visual.material.baseColorFactor.tolist() == [255, 0, 0, 255]
+
+
+@pytest.mark.parametrize("prompt,shape", [
+    ("a Cat sitting on a table", "animal"),
+    ("two red boxes", "cube"),
+    ("some pipes", "cylinder"),
+    ("a scarf", None),
+    ("nobody cares", None),
+    ("benches and trees", "tree"),
+    ("bring me something", None),
+])
+def test_shape_keywords_match_whole_words(prompt, shape):
+    """Keywords match words (and plurals) by group priority, not substrings"""
+    words = set(model_generator._WORD_PATTERN.findall(prompt.lower()))
+    assert model_generator._match_keyword(words, model_generator._SHAPE_KEYWORDS) == shape
+
+
+def test_color_keyword_priority():
+    """When several colors are named the earliest listed one wins"""
+    words = {"blue", "and", "red"}
+    assert model_generator._match_keyword(words, model_generator._COLOR_KEYWORDS) == (255, 0, 0, 255)
+    assert model_generator._match_keyword({"plain"}, model_generator._COLOR_KEYWORDS) is None
+
+
+def test_assemble_scales_offsets_and_reindexes_parts():
+    """Parts are transformed in place and their faces point at their own vertices"""
+    cube = model_generator._cube_template(1.0)
+    mesh = model_generator._assemble([(cube, 1.0, 0.0), (cube, (2.0, 1.0, 1.0), (0, 0, 3))])
+    assert len(mesh.vertices) == 16
+    assert mesh.faces[len(cube.faces):].min() == len(cube.vertices)
+    assert mesh.bounds.tolist() == [[-1.0, -0.5, -0.5], [1.0, 0.5, 3.5]]
+    assert cube.bounds.tolist() == [[-0.5, -0.5, -0.5], [0.5, 0.5, 0.5]]
+
+
+def test_every_shape_has_a_builder():
+    """Each keyword group dispatches to a mesh builder"""
+    shapes = {shape for shape, _ in model_generator._SHAPE_GROUPS}
+    assert shapes == set(model_generator._SHAPE_BUILDERS)
+
+
+def test_bare_shape_name_takes_fast_path(tmp_path, monkeypatch):
+    """A prompt that is just a shape name skips tokenizing"""
+    def fail(*args):
+        raise AssertionError("tokenized")
+
+    monkeypatch.setattr(model_generator, "_match_keyword", fail)
+    output = tmp_path / "cube.glb"
+    generate_model_from_prompt(" Cube ", str(output))
+    mesh = next(iter(trimesh.load(str(output)).geometry.values()))
+    assert len(mesh.vertices) == 8
+
+
+def test_output_directory_created_once(tmp_path, monkeypatch):
+    """makedirs runs for the first export into a directory, and again if it disappears"""
+    calls = []
+    real_makedirs = os.makedirs
+    monkeypatch.setattr(model_generator, "_ensured_dirs", set())
+    monkeypatch.setattr(model_generator.os, "makedirs", lambda *a, **k: (calls.append(a[0]), real_makedirs(*a, **k)))
+    directory = tmp_path / "models"
+
+    generate_model_from_prompt("cube", str(directory / "a.glb"))
+    generate_model_from_prompt("cube", str(directory / "b.glb"))
+    assert calls == [str(directory)]
+
+    for path in directory.iterdir():
+        path.unlink()
+    directory.rmdir()
+    generate_model_from_prompt("cube", str(directory / "c.glb"))
+    assert (directory / "c.glb").exists()
+
+
+def test_generate_endpoint_builds_model_off_the_event_loop(tmp_path, monkeypatch):
+    """/3d/generate runs the blocking generator in the threadpool"""
+    import threading
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from routers.models_3d import router
+
+    monkeypatch.chdir(tmp_path)
+    threads = []
+    real_generate = model_generator.generate_model_from_prompt
+
+    def recording_generate(prompt, output_path):
+        threads.append(threading.current_thread())
+        return real_generate(prompt, output_path)
+
+    monkeypatch.setattr(model_generator, "generate_model_from_prompt", recording_generate)
+    app = FastAPI()
+    app.include_router(router)
+
+    with TestClient(app) as client:
+        loop_thread = client.portal.call(threading.current_thread)
+        response = client.post("/3d/generate", json={"prompt": "blue chair"})
+
+    assert response.status_code == 200
+    assert (tmp_path / "static" / "models" / f"{response.json()['model_id']}.glb").exists()
+    assert threads and threads[0] is not loop_thread
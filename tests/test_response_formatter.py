@@ -0,0 +1,60 @@
+"""
+Tests for markdown post-processing of AI responses
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.response_formatter import ResponseFormatter
+
+RULES = {"use_headers": True, "use_lists": True, "use_bold": "moderate"}
+
+
+def test_formats_lists_headers_and_keywords():
+    """All rules are applied outside code blocks"""
+    raw = "Setup Steps:\n  -install deps\n1.run it\nNote this is important."
+    assert ResponseFormatter().format_response(raw, RULES) == (
+        "## Setup Steps\n- install deps\n1. run it\n**Note** this is **important**."
+    )
+
+
+def test_code_blocks_are_untouched():
+    """Fenced code is passed through verbatim"""
+    raw = "Output:\n```\n-x\nerror\n```\nplain"
+    assert ResponseFormatter().format_response(raw, RULES) == "## Output\n```\n-x\nerror\n```\nplain"
+
+
+def test_rules_are_optional():
+    """Disabled rules leave the text unchanged"""
+    raw = "Title:\n-item\nwarning"
+    assert ResponseFormatter().format_response(raw, {}) == raw
+
+
+def test_plain_text_passes_through():
+    """Text without any markers is returned unchanged"""
+    raw = "hello there\nhow are you"
+    assert ResponseFormatter().format_response(raw, RULES) == raw
+
+
+async def test_format_stream_formats_lines_as_they_complete():
+    """Streamed output is formatted per line and matches the batch result"""
+    async def chunks():
+        for chunk in ("Setup Ste", "ps:\n-inst", "all\n```\n-x\n", "```\nnote the end"):
+            yield chunk
+
+    formatter = ResponseFormatter()
+    out = [text async for text in formatter.format_stream(chunks(), RULES)]
+
+    assert out[0] == "## Setup Steps\n"
+    assert "".join(out) == "## Setup Steps\n- install\n```\n-x\n```\n**note** the end"
+
+
+async def test_format_stream_joins_partial_line_across_many_chunks():
+    """A line split over many newline-free chunks is formatted once, whole"""
+    async def chunks():
+        for chunk in ("-", "it", "em", "\n", "Title", ":", "\nwarn", "ing"):
+            yield chunk
+
+    out = [text async for text in ResponseFormatter().format_stream(chunks(), RULES)]
+
+    assert out == ["- item\n", "## Title\n", "**warning**"]
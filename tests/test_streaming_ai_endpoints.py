@@ -0,0 +1,375 @@
+"""
+Tests for the /ai/stream SSE endpoints
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import utils.streaming_ai_endpoints as streaming_endpoints
+from utils.streaming_ai_endpoints import streaming_ai_router
+from utils.claude_client import ClaudeClient
+
+
+class FakeStream:
+    """Async context manager mimicking messages.create(stream=True)"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        usage = SimpleNamespace(input_tokens=10, output_tokens=1)
+        yield SimpleNamespace(type="message_start", message=SimpleNamespace(usage=usage))
+        for chunk in self.chunks:
+            yield SimpleNamespace(type="content_block_delta", delta=SimpleNamespace(type="text_delta", text=chunk))
+        yield SimpleNamespace(type="message_delta", usage=SimpleNamespace(output_tokens=5))
+        yield SimpleNamespace(type="message_stop")
+
+
+class FakeMessages:
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return FakeStream(["Hi", " there"])
+
+
+@pytest.fixture
+def claude(monkeypatch):
+    """Enabled client whose streaming API call is stubbed out"""
+    monkeypatch.delenv("BRAVE_SEARCH_API_KEY", raising=False)
+    monkeypatch.setattr(streaming_endpoints, "BRAVE_SEARCH_KEY", None)
+    claude = ClaudeClient(api_key="test-key")
+    monkeypatch.setattr(claude.client, "messages", FakeMessages())
+    monkeypatch.setattr(streaming_endpoints, "get_claude_client", lambda: claude)
+    return claude
+
+
+@pytest.fixture
+def client(claude):
+    app = FastAPI()
+    app.include_router(streaming_ai_router)
+    return TestClient(app)
+
+
+def chat(client, messages):
+    response = client.post("/ai/stream/chat", json={"messages": messages, "conversation_id": "c1"})
+    assert response.status_code == 200
+    return [json.loads(frame[len("data: "):]) for frame in response.text.split("\n\n") if frame]
+
+
+def test_chat_streams_and_saves_turn(client, claude):
+    """Chunks are framed as SSE events and the turn is stored once"""
+    events = chat(client, [{"role": "user", "content": "hello"}])
+    assert [e["text"] for e in events if e["type"] == "content"] == ["Hi there"]
+    assert events[-1]["conversation_length"] == 2
+    assert claude.conversations["c1"] == [
+        {"role": "user", "content": "hello"},
+        {"role": "assistant", "content": "Hi there"}
+    ]
+
+
+def test_chat_turns_are_persisted_and_restored(client, claude, monkeypatch):
+    """Streamed turns reach Redis and later requests start from the Redis copy"""
+    store = {}
+
+    class FakeRedis:
+        async def get(self, key):
+            return store.get(key)
+
+        async def set(self, key, value, ex=None):
+            store[key] = value
+
+    import utils.claude_client as claude_module
+    monkeypatch.setattr(claude_module, "get_redis_client", lambda: FakeRedis())
+    chat(client, [{"role": "user", "content": "hello"}])
+    assert "conv:c1" in store
+
+    claude.conversations.clear()  # e.g. served by another worker
+    chat(client, [{"role": "user", "content": "again"}])
+    sent = claude.client.messages.calls[-1]["messages"]
+    assert [m["content"] for m in sent] == ["hello", "Hi there", "again"]
+
+
+def test_chat_logs_one_summary(client, claude, caplog):
+    """A streamed chat emits a single INFO summary instead of per-step logs"""
+    with caplog.at_level("INFO", logger=streaming_endpoints.logger.name):
+        chat(client, [{"role": "user", "content": "hello"}])
+    records = [r for r in caplog.records if r.name == streaming_endpoints.logger.name]
+    assert [r.getMessage() for r in records] == [
+        f"stream_chat cid=c1 msgs=1 search_results=0 chars=8 model={claude.active_model}"
+    ]
+
+
+def test_failed_chat_does_not_take_a_store_slot(client, claude, monkeypatch):
+    """A stream that errors before replying leaves the conversation store untouched"""
+    async def fail(**kwargs):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(claude.client.messages, "create", fail)
+    events = chat(client, [{"role": "user", "content": "hello"}])
+    assert events == [{"type": "error", "error": "upstream down"}]
+    assert "c1" not in claude.conversations
+
+
+async def test_concurrent_chats_on_one_conversation_take_turns(claude):
+    """A second request for the same conversation waits for the first reply to be saved"""
+    async def send(content):
+        request = streaming_endpoints.StreamChatRequest(
+            messages=[{"role": "user", "content": content}], conversation_id="c1"
+        )
+        response = await streaming_endpoints.stream_chat(request)
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    await asyncio.gather(send("first"), send("second"))
+    sent = [[m["content"] for m in call["messages"]] for call in claude.client.messages.calls]
+    assert sent == [["first"], ["first", "Hi there", "second"]]
+    assert len(claude.conversations["c1"]) == 4
+
+
+def test_conversation_lock_is_per_id_and_released(claude):
+    """Locks are shared per conversation and dropped once unused"""
+    lock = claude.conversation_lock("a")
+    assert claude.conversation_lock("a") is lock
+    assert claude.conversation_lock("b") is not lock
+    del lock
+    assert "a" not in claude._conversation_locks
+
+
+def test_chat_repeated_message_is_kept(client, claude):
+    """A user repeating an earlier message is still a new turn"""
+    chat(client, [{"role": "user", "content": "yes"}])
+    chat(client, [{"role": "user", "content": "yes"}])
+    assert [m["content"] for m in claude.conversations["c1"]] == ["yes", "Hi there", "yes", "Hi there"]
+
+
+def test_chat_resent_transcript_is_not_duplicated(client, claude):
+    """Clients that resend the full transcript do not duplicate stored turns"""
+    first = [{"role": "user", "content": "hello"}]
+    chat(client, first)
+    chat(client, first + [{"role": "assistant", "content": "Hi there"}, {"role": "user", "content": "again"}])
+
+    sent = claude.client.messages.calls[-1]["messages"]
+    assert [m["content"] for m in sent] == ["hello", "Hi there", "again"]
+    assert len(claude.conversations["c1"]) == 4
+
+
+async def test_brave_search_uses_shared_client(claude, monkeypatch):
+    """Streaming search goes through ClaudeClient and maps descriptions to snippets"""
+    monkeypatch.setattr(streaming_endpoints, "BRAVE_SEARCH_KEY", "brave-key")
+    calls = []
+
+    async def fake_search_web(query, count=5):
+        calls.append((query, count))
+        return [
+            {"title": " T ", "url": "https://example.com", "description": "D"},
+            {"title": "No snippet", "url": "https://example.org", "description": None},
+        ]
+
+    monkeypatch.setattr(claude, "search_web", fake_search_web)
+    assert await streaming_endpoints.brave_search("news", count=3) == [
+        {"title": "T", "url": "https://example.com", "snippet": "D"},
+        {"title": "No snippet", "url": "https://example.org", "snippet": ""},
+    ]
+    assert calls == [("news", 3)]
+
+
+def test_generate_streams_utf8_frames(client, claude, monkeypatch):
+    """Frames are UTF-8 JSON bytes, with non-ASCII text left unescaped"""
+    async def create(**kwargs):
+        assert kwargs["stream"] is True
+        return FakeStream(["héllo ", "🌧"])
+
+    monkeypatch.setattr(claude.client.messages, "create", create)
+    response = client.post("/ai/stream/generate", json={"prompt": "hi"})
+    assert response.status_code == 200
+    assert 'data: {"text":"héllo 🌧","type":"content"}\n\n' in response.text
+    events = [json.loads(frame[len("data: "):]) for frame in response.text.split("\n\n") if frame]
+    assert [e["text"] for e in events if e["type"] == "content"] == ["héllo 🌧"]
+    assert events[-1]["type"] == "done"
+
+
+async def _timed(items):
+    """Yield (delay, item) pairs after sleeping for each delay"""
+    for delay, item in items:
+        await asyncio.sleep(delay)
+        yield item
+
+
+async def test_coalesce_chunks_merges_bursts():
+    """Chunks that are ready together are merged up to max_chars"""
+    stream = _timed([(0, "ab"), (0, "cd"), (0, "ef"), (0, "g")])
+    pieces = [p async for p in streaming_endpoints.coalesce_chunks(stream, max_chars=4)]
+    assert pieces == ["abcd", "efg"]
+
+
+async def test_coalesce_chunks_flushes_on_pause():
+    """A pause longer than max_delay releases buffered text without losing the pending read"""
+    stream = _timed([(0, "a"), (0, "b"), (0.05, "c"), (0, "d")])
+    pieces = [p async for p in streaming_endpoints.coalesce_chunks(stream, max_delay=0.01)]
+    assert pieces == ["ab", "cd"]
+
+
+async def test_coalesce_chunks_flushes_before_error():
+    """Buffered text is delivered before a stream error propagates"""
+    async def failing():
+        yield "a"
+        raise RuntimeError("boom")
+
+    pieces = []
+    with pytest.raises(RuntimeError):
+        async for piece in streaming_endpoints.coalesce_chunks(failing()):
+            pieces.append(piece)
+    assert pieces == ["a"]
+
+
+async def test_text_deltas_skips_non_text_events():
+    """Only non-empty text deltas are forwarded from the raw event stream"""
+    async def events():
+        yield SimpleNamespace(type="content_block_start")
+        yield SimpleNamespace(type="content_block_delta", delta=SimpleNamespace(type="text_delta", text="a"))
+        yield SimpleNamespace(type="content_block_delta", delta=SimpleNamespace(type="text_delta", text=""))
+        yield SimpleNamespace(type="content_block_delta", delta=SimpleNamespace(type="input_json_delta", partial_json="{"))
+        yield SimpleNamespace(type="message_delta", delta=SimpleNamespace(type="text_delta", text="x"))
+
+    assert [t async for t in streaming_endpoints.text_deltas(events())] == ["a"]
+
+
+def test_stream_goes_through_rate_limiter(client, claude, monkeypatch):
+    """SSE calls are retried on 429 and settle the limiter with the reported usage"""
+    import anthropic
+    import httpx
+    settled = []
+    create = claude.client.messages.create
+    attempts = []
+
+    async def flaky(**kwargs):
+        attempts.append(kwargs)
+        if len(attempts) == 1:
+            request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+            raise anthropic.RateLimitError("slow down", response=httpx.Response(429, request=request), body=None)
+        return await create(**kwargs)
+
+    monkeypatch.setattr(claude.client.messages, "create", flaky)
+    monkeypatch.setattr(claude.rate_limiter, "settle", lambda estimated, actual: settled.append(actual))
+    monkeypatch.setattr(claude, "_retry_after", lambda error, attempt: 0.0)
+    response = client.post("/ai/stream/generate", json={"prompt": "hi"})
+
+    assert b"Hi there" in response.content
+    assert len(attempts) == 2
+    assert settled == [15]
+
+
+def test_auth_error_frame(client, claude, monkeypatch):
+    """Authentication failures end the stream with the precomputed error frame"""
+    import anthropic
+    import httpx
+
+    async def reject(**kwargs):
+        request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+        raise anthropic.AuthenticationError("bad key", response=httpx.Response(401, request=request), body=None)
+
+    monkeypatch.setattr(claude.client.messages, "create", reject)
+    response = client.post("/ai/stream/generate", json={"prompt": "hi"})
+    assert response.content == streaming_endpoints.AUTH_ERROR_FRAME
+    assert json.loads(response.text[len("data: "):]) == {"type": "error", "error": "Invalid API key"}
+
+
+@pytest.mark.parametrize("text", ["word", " héllo 🌧", "", 'say "hi"', "back\\slash", "line\nbreak", "\x1f"])
+def test_content_frame_matches_json_encoding(text):
+    """Frames are byte-identical to encoding the whole payload as JSON"""
+    frame = streaming_endpoints.content_frame(text)
+    assert frame == b"data: " + json.dumps({"text": text, "type": "content"}, ensure_ascii=False, separators=(",", ":")).encode() + b"\n\n"
+
+
+def test_event_frame_is_single_sse_event():
+    """Done/error frames are one data line of compact UTF-8 JSON"""
+    frame = streaming_endpoints.event_frame({"type": "error", "error": "línea\nrota"})
+    assert frame.startswith(b"data: ") and frame.endswith(b"\n\n")
+    assert frame.count(b"\n") == 2
+    assert json.loads(frame[len(b"data: "):]) == {"type": "error", "error": "línea\nrota"}
+
+
+def test_unsent_messages_after_trimmed_history():
+    """A resent transcript is aligned on the stored history's last exchange"""
+    transcript = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"m{i}"} for i in range(60)]
+    history = transcript[-20:]  # older turns already trimmed from storage
+    new_turn = [{"role": "user", "content": "next"}]
+
+    assert streaming_endpoints.unsent_messages(history, transcript + new_turn) == new_turn
+    assert streaming_endpoints.unsent_messages(history, new_turn) == new_turn
+    assert streaming_endpoints.unsent_messages([], transcript) == transcript
+
+
+def test_build_system_prompt_caches_only_repeatable_prompts():
+    """Prompts without web results are cached; search-specific ones are not"""
+    build = streaming_endpoints.build_system_prompt
+    cache = streaming_endpoints._cached_system_prompt
+    cache.cache_clear()
+
+    assert build("Today", "") == f"Today\n\n{streaming_endpoints.DEFAULT_ASSISTANT_PROMPT}"
+    assert build("Today", "Be brief", guidance="!") == "Today\n\nBe brief!"
+    assert build("Today", "Be brief", guidance="!") == "Today\n\nBe brief!"
+    assert build("Today", "Be brief", "Web context") == "Today\n\nBe brief\n\nWeb context"
+    assert build("Today", "", "Web context") == "Today\n\nWeb context"
+    assert (cache.cache_info().hits, cache.cache_info().currsize) == (1, 2)
+
+
+async def test_event_stream_pings_while_idle():
+    """Idle gaps are filled with keep-alive comments between data frames"""
+    async def slow():
+        yield b"data: 1\n\n"
+        await asyncio.sleep(0.12)
+        yield b"data: 2\n\n"
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    response = streaming_endpoints.EventStreamResponse(slow(), ping_interval=0.05)
+    await response.stream_response(send)
+
+    assert sent[0]["type"] == "http.response.start"
+    assert (b"x-accel-buffering", b"no") in sent[0]["headers"]
+    bodies = [m["body"] for m in sent[1:]]
+    assert bodies[0] == b"data: 1\n\n"
+    assert streaming_endpoints.KEEPALIVE_FRAME in bodies[1:-2]
+    assert bodies[-2:] == [b"data: 2\n\n", b""]
+
+
+async def test_failed_ping_does_not_leave_task_error(monkeypatch):
+    """A send failing during a ping ends the pinger quietly"""
+    async def slow():
+        yield b"data: 1\n\n"
+        await asyncio.sleep(0.12)
+        yield b"data: 2\n\n"
+
+    pings = []
+
+    async def send(message):
+        if message.get("body") == streaming_endpoints.KEEPALIVE_FRAME:
+            pings.append(message)
+            raise OSError("client disconnected")
+
+    tasks = []
+    ensure_future = asyncio.ensure_future
+    monkeypatch.setattr(asyncio, "ensure_future", lambda coro: tasks.append(ensure_future(coro)) or tasks[-1])
+    response = streaming_endpoints.EventStreamResponse(slow(), ping_interval=0.05)
+    await response.stream_response(send)
+
+    assert len(pings) == 1
+    pinger = tasks[0]
+    assert pinger.done() and not pinger.cancelled() and pinger.exception() is None
@@ -0,0 +1,57 @@
+"""
+Tests for input validation and spam heuristics
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.validation import InputValidator
+
+
+def test_spam_score_clean_message():
+    """Ordinary chat scores zero"""
+    assert InputValidator.spam_score("Hey, are we still meeting at 5?") == 0.0
+    assert InputValidator.spam_score("") == 0.0
+
+
+def test_spam_score_many_urls_is_certain():
+    """More than three links is treated as certain spam"""
+    text = "https://a.com http://b.com www.c.com https://d.com/x"
+    assert InputValidator.spam_score(text) == 1.0
+
+
+def test_spam_score_ignores_file_names():
+    """Dotted words without a scheme or www. are not links"""
+    assert InputValidator.spam_score("check main.py and utils.py, node.js, setup.py") == 0.0
+    assert InputValidator.spam_score("open README.md") == 0.0
+    assert InputValidator.spam_score("see https://example.com") == 0.25
+
+
+def test_spam_score_combines_signals():
+    """Shorteners plus crypto solicitation push the score past certainty"""
+    text = "Double your bitcoin guaranteed!! bit.ly/abc123"
+    assert InputValidator.spam_score(text) >= 0.9
+
+
+def test_spam_score_ambiguous_keyword():
+    """A single weak signal lands in the ambiguous band"""
+    score = InputValidator.spam_score("click here for the notes")
+    assert 0.3 <= score < 0.9
+
+
+def test_spam_score_confusables():
+    """Latin mixed with Cyrillic look-alikes is suspicious"""
+    assert InputValidator.spam_score("Visit pаypal support") > 0.0
+
+
+def test_is_trivially_safe():
+    """Only known-benign phrases bypass AI moderation"""
+    assert not InputValidator.is_trivially_safe("hi all, see you at 5!")
+    assert InputValidator.is_trivially_safe("Hi all!")
+    assert InputValidator.is_trivially_safe("ok,  thanks!!")
+    assert not InputValidator.is_trivially_safe("I will kill you")
+    assert not InputValidator.is_trivially_safe("kys loser")
+    assert not InputValidator.is_trivially_safe("hello\n")
+    assert not InputValidator.is_trivially_safe("check example.com")
+    assert not InputValidator.is_trivially_safe("buy now")
+    assert not InputValidator.is_trivially_safe("héllo")
@@ -2,17 +2,55 @@
 Example AI endpoints using Claude API
 Add these to your main.py to enable AI features
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-from utils.claude_client import get_claude_client
+from functools import lru_cache
+from utils.claude_client import get_claude_client, ClaudeClient
 import logging
+import time
+import msgspec
+import orjson
 
 logger = logging.getLogger(__name__)
 
 # Create router for AI endpoints
 ai_router = APIRouter(prefix="/ai", tags=["AI Features"])
 
+# Invariant payloads, serialized once at import time
+AI_FEATURES = (
+    "content_moderation",
+    "spam_detection",
+    "conversation_summary",
+    "smart_replies",
+    "ai_generation",
+    "conversation_history",
+    "web_search",
+)
+MODERATION_DISABLED_BODY = orjson.dumps({
+    "is_safe": True,
+    "reason": "Moderation disabled",
+    "confidence": 0.0
+})
+SPAM_DISABLED_BODY = orjson.dumps({"is_spam": False, "confidence": 0.0})
+AI_HEALTH_DISABLED_BODY = orjson.dumps({
+    "ai_enabled": False,
+    "search_enabled": False,
+    "model": None,
+    "fallback_model": None,
+    "active_conversations": 0,
+    "features": []
+})
+HEALTH_CACHE_SECONDS = 5
+
+
+def json_response(content) -> Response:
+    """Serialize with orjson, bypassing FastAPI's jsonable_encoder pass"""
+    if not isinstance(content, bytes):
+        content = orjson.dumps(content)
+    return Response(content=content, media_type="application/json")
+
 
 class AIRequest(BaseModel):
     """Request for AI generation"""
@@ -23,11 +61,40 @@ class AIRequest(BaseModel):
     enable_search: bool = True  # NEW: Enable/disable web search
 
 
-class ContentModerationRequest(BaseModel):
-    """Request for content moderation"""
+class ContentModerationRequest(msgspec.Struct):
+    """Request for content moderation (decoded with msgspec on the hot path)"""
     content: str
 
 
+_moderation_decoder = msgspec.json.Decoder(ContentModerationRequest)
+CONTENT_MODERATION_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": {
+                    "title": "ContentModerationRequest",
+                    "type": "object",
+                    "required": ["content"],
+                    "properties": {"content": {"title": "Content", "type": "string"}}
+                }
+            }
+        }
+    }
+}
+
+
+async def parse_moderation_request(request: Request) -> ContentModerationRequest:
+    """Decode and validate a ContentModerationRequest body"""
+    body = await request.body()
+    try:
+        return _moderation_decoder.decode(body)
+    except msgspec.ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except msgspec.DecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+
+
 class ConversationSummaryRequest(BaseModel):
     """Request for conversation summary"""
     messages: List[dict]  # [{"username": str, "content": str}, ...]
@@ -48,7 +115,7 @@ class ConversationManagementRequest(BaseModel):
 
 # AI Generation Endpoint
 @ai_router.post("/generate")
-async def generate_ai_response(request: AIRequest):
+async def generate_ai_response(request: AIRequest, debug: bool = False):
     """
     Generate AI response using Claude with optional conversation history and web search.
     
@@ -78,6 +145,8 @@ async def generate_ai_response(request: AIRequest):
             "conversation_id": "user_123",
             "enable_search": true
         }
+    
+    Pass ?debug=true to include response diagnostics in "debug_info".
     """
     claude = get_claude_client()
     
@@ -95,37 +164,89 @@ async def generate_ai_response(request: AIRequest):
             conversation_id=request.conversation_id,
             enable_search=request.enable_search  # NEW: Pass enable_search flag
         )
-        model_info = claude.get_model_info()
+        conversation_length = claude.get_conversation_count(request.conversation_id) if request.conversation_id else 0
         
-        # Diagnostic logging
-        logger.info('=== AI GENERATE RESPONSE ===')
-        logger.info(f'Response length: {len(response)}')
-        logger.info(f'Conversation ID: {request.conversation_id}')
-        logger.info(f'Search enabled: {request.enable_search}')  # NEW: Log search status
-        if request.conversation_id:
-            logger.info(f'History length: {claude.get_conversation_count(request.conversation_id)}')
-        logger.info('============================')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "AI generate response (len=%d, conversation_id=%s, search=%s, history_length=%d)",
+                len(response),
+                request.conversation_id,
+                request.enable_search,
+                conversation_length
+            )
         
-        return {
+        result = {
             "response": response, 
-            "model": model_info["active_model"],
+            "model": claude.active_model,
             "search_enabled": claude.is_search_enabled,  # NEW: Return search status
             "conversation_id": request.conversation_id,
-            "conversation_length": claude.get_conversation_count(request.conversation_id) if request.conversation_id else 0,
-            "debug_info": {
+            "conversation_length": conversation_length
+        }
+        if debug:
+            space_count = response.count(" ")
+            result["debug_info"] = {
                 "response_length": len(response),
-                "has_spaces": " " in response,
-                "space_count": response.count(" "),
-                "word_count": len(response.split())
+                "has_spaces": space_count > 0,
+                "space_count": space_count,
+                "word_count": space_count + 1 if response else 0
             }
-        }
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI generation failed: {str(e)}")
 
 
+# Streaming AI Generation Endpoint
+@ai_router.post("/generate/stream")
+async def stream_ai_response(request: AIRequest):
+    """
+    Stream an AI response as Server-Sent Events.
+    
+    Accepts the same body as /ai/generate. Emits frames of the form
+        data: {"type": "content", "text": "..."}
+    followed by a final {"type": "done", ...} or {"type": "error", ...} frame.
+    """
+    claude = get_claude_client()
+    
+    if not claude.is_enabled:
+        raise HTTPException(
+            status_code=503,
+            detail="Claude AI is not configured. Add ANTHROPIC_API_KEY to environment."
+        )
+    
+    async def event_stream():
+        try:
+            async for text in claude.stream_response(
+                prompt=request.prompt,
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                conversation_id=request.conversation_id,
+                enable_search=request.enable_search
+            ):
+                yield b"data: " + orjson.dumps({"type": "content", "text": text}) + b"\n\n"
+            
+            yield b"data: " + orjson.dumps({
+                "type": "done",
+                "model": claude.active_model,
+                "conversation_id": request.conversation_id,
+                "conversation_length": claude.get_conversation_count(request.conversation_id) if request.conversation_id else 0
+            }) + b"\n\n"
+        except Exception as e:
+            logger.error("AI stream failed: %s", e, exc_info=True)
+            yield b"data: " + orjson.dumps({"type": "error", "error": str(e)}) + b"\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 # Content Moderation Endpoint
-@ai_router.post("/moderate")
-async def moderate_content(request: ContentModerationRequest):
+@ai_router.post("/moderate", openapi_extra=CONTENT_MODERATION_OPENAPI)
+async def moderate_content(request: ContentModerationRequest = Depends(parse_moderation_request)):
     """
     Moderate content for safety.
     
@@ -148,22 +269,18 @@ async def moderate_content(request: ContentModerationRequest):
     
     if not claude.is_enabled:
         # Fail open if moderation is disabled
-        return {
-            "is_safe": True,
-            "reason": "Moderation disabled",
-            "confidence": 0.0
-        }
+        return json_response(MODERATION_DISABLED_BODY)
     
     try:
-        result = claude.moderate_content(request.content)
-        return result
+        result = await claude.moderate_content(request.content)
+        return json_response(result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Moderation failed: {str(e)}")
 
 
 # Spam Detection Endpoint
-@ai_router.post("/detect-spam")
-async def detect_spam(request: ContentModerationRequest):
+@ai_router.post("/detect-spam", openapi_extra=CONTENT_MODERATION_OPENAPI)
+async def detect_spam(request: ContentModerationRequest = Depends(parse_moderation_request)):
     """
     Detect if message is spam.
     
@@ -176,11 +293,11 @@ async def detect_spam(request: ContentModerationRequest):
     claude = get_claude_client()
     
     if not claude.is_enabled:
-        return {"is_spam": False, "confidence": 0.0}
+        return json_response(SPAM_DISABLED_BODY)
     
     try:
-        is_spam = claude.detect_spam(request.content)
-        return {"is_spam": is_spam}
+        is_spam = await claude.detect_spam(request.content)
+        return json_response({"is_spam": is_spam})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Spam detection failed: {str(e)}")
 
@@ -269,7 +386,7 @@ async def clear_conversation(request: ConversationManagementRequest):
         raise HTTPException(status_code=503, detail="AI features not configured")
     
     try:
-        claude.clear_conversation(request.conversation_id)
+        await claude.aclear_conversation(request.conversation_id)
         return {
             "success": True,
             "message": f"Conversation history cleared for: {request.conversation_id}"
@@ -342,29 +459,28 @@ async def get_conversation_count(conversation_id: str):
 
 
 # Health check for AI features
+@lru_cache(maxsize=1)
+def _health_body(claude: ClaudeClient, bucket: int) -> bytes:
+    """Serialized health payload, reused within a HEALTH_CACHE_SECONDS bucket"""
+    model_info = claude.get_model_info()
+    return orjson.dumps({
+        "ai_enabled": True,
+        "search_enabled": claude.is_search_enabled,
+        "model": model_info["active_model"],
+        "fallback_model": model_info["fallback_model"],
+        "active_conversations": model_info["active_conversations"],
+        "features": AI_FEATURES
+    })
+
+
 @ai_router.get("/health")
 async def ai_health_check():
     """Check if AI features are available"""
     claude = get_claude_client()
-    model_info = claude.get_model_info() if claude.is_enabled else {}
-    
-    return {
-        "ai_enabled": claude.is_enabled,
-        "search_enabled": claude.is_search_enabled if claude.is_enabled else False,  # NEW: Search status
-        "model": model_info.get("active_model") if claude.is_enabled else None,
-        "fallback_model": model_info.get("fallback_model") if claude.is_enabled else None,
-        "active_conversations": model_info.get("active_conversations", 0) if claude.is_enabled else 0,
-        "features": [
-            "content_moderation",
-            "spam_detection",
-            "conversation_summary",
-            "smart_replies",
-            "ai_generation",
-            "conversation_history",
-            "web_search"  # NEW: Web search feature
-        ] if claude.is_enabled else []
-    }
-
+    if not claude.is_enabled:
+        return json_response(AI_HEALTH_DISABLED_BODY)
+    
+    return json_response(_health_body(claude, int(time.monotonic() // HEALTH_CACHE_SECONDS)))
 
 # To use these endpoints in your main.py, add:
 # from utils.ai_endpoints import ai_router
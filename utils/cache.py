@@ -2,74 +2,145 @@
 Caching utilities for improved performance
 """
 import time
-from typing import Any, Optional, Callable
+import threading
+import hashlib
+import orjson
+from typing import Any, Optional, Callable, Tuple
 from functools import wraps
 from collections import OrderedDict
 
 
 class LRUCache:
     """
-    Simple LRU (Least Recently Used) cache implementation.
+    Simple thread-safe LRU (Least Recently Used) cache implementation.
     For production, use Redis or similar external cache.
+    
+    Each entry is stored once as (expiry_timestamp, value) using the
+    monotonic clock. Expired entries are dropped on lookup, and every
+    SWEEP_INTERVAL writes the oldest entries are swept from the front.
     """
     
+    SWEEP_INTERVAL = 128
+    
     def __init__(self, max_size: int = 1000, ttl: int = 300):
         """
         Args:
             max_size: Maximum number of items to store
             ttl: Time to live in seconds
         """
-        self.cache: OrderedDict = OrderedDict()
+        self.cache: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
         self.max_size = max_size
         self.ttl = ttl
-        self.timestamps: dict = {}
+        self._lock = threading.Lock()
+        self._writes = 0
     
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
-        if key not in self.cache:
-            return None
-        
-        # Check if expired
-        if time.time() - self.timestamps.get(key, 0) > self.ttl:
-            self.delete(key)
-            return None
-        
-        # Move to end (most recently used)
-        self.cache.move_to_end(key)
-        return self.cache[key]
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return None
+            
+            # Check if expired
+            expires_at, value = entry
+            if time.monotonic() > expires_at:
+                del self.cache[key]
+                return None
+            
+            # Move to end (most recently used)
+            self.cache.move_to_end(key)
+            return value
     
     def set(self, key: str, value: Any) -> None:
         """Set value in cache"""
-        if key in self.cache:
-            # Update existing
-            self.cache.move_to_end(key)
-        else:
-            # Add new
-            if len(self.cache) >= self.max_size:
+        with self._lock:
+            if key in self.cache:
+                # Update existing
+                self.cache.move_to_end(key)
+            elif len(self.cache) >= self.max_size:
                 # Remove least recently used
-                oldest_key = next(iter(self.cache))
-                self.delete(oldest_key)
-        
-        self.cache[key] = value
-        self.timestamps[key] = time.time()
+                self.cache.popitem(last=False)
+            
+            now = time.monotonic()
+            self.cache[key] = (now + self.ttl, value)
+            
+            self._writes += 1
+            if self._writes % self.SWEEP_INTERVAL == 0:
+                self._sweep(now)
+    
+    def _sweep(self, now: float) -> None:
+        """Pop expired entries from the least recently used end (lock held)"""
+        cache = self.cache
+        while cache:
+            oldest_key = next(iter(cache))
+            if cache[oldest_key][0] >= now:
+                break
+            del cache[oldest_key]
     
     def delete(self, key: str) -> None:
         """Delete value from cache"""
-        if key in self.cache:
-            del self.cache[key]
-        if key in self.timestamps:
-            del self.timestamps[key]
+        with self._lock:
+            self.cache.pop(key, None)
     
     def clear(self) -> None:
         """Clear all cache"""
-        self.cache.clear()
-        self.timestamps.clear()
+        with self._lock:
+            self.cache.clear()
     
     def size(self) -> int:
         """Get current cache size"""
         return len(self.cache)
 
 
+_KEY_SCALARS = (str, float, bool, type(None))
+_INT64_MIN = -(2 ** 63)
+_UINT64_MAX = 2 ** 64 - 1
+
+
+def _tag_key_value(value: Any) -> Any:
+    """
+    JSON-safe form of a cache key argument with container types encoded,
+    so (1, 2) and [1, 2] give different keys.
+    
+    Raises TypeError for objects with the default repr, whose memory
+    address could be reused by a different object after garbage collection.
+    """
+    if isinstance(value, _KEY_SCALARS):
+        return value
+    if isinstance(value, int):
+        # orjson only encodes 64-bit integers
+        return value if _INT64_MIN <= value <= _UINT64_MAX else ["int", str(value)]
+    if isinstance(value, tuple):
+        return ["tuple", [_tag_key_value(v) for v in value]]
+    if isinstance(value, list):
+        return ["list", [_tag_key_value(v) for v in value]]
+    if isinstance(value, dict):
+        items = [[_tag_key_value(k), _tag_key_value(v)] for k, v in value.items()]
+        return ["dict", sorted(items, key=lambda item: orjson.dumps(item[0]))]
+    if isinstance(value, (set, frozenset)):
+        return [type(value).__name__, sorted((_tag_key_value(v) for v in value), key=orjson.dumps)]
+    if isinstance(value, bytes):
+        return ["bytes", value.hex()]
+    if type(value).__repr__ is object.__repr__:
+        raise TypeError(f"{type(value).__qualname__} has no stable cache key")
+    return ["repr", type(value).__qualname__, repr(value)]
+
+
+def make_cache_key(args: tuple, kwargs: dict) -> Optional[str]:
+    """
+    Build a compact, deterministic cache key for a function call.
+    
+    Arguments are type-tagged, serialized with orjson and hashed with a
+    128-bit BLAKE2b digest. Returns None when an argument has no stable
+    key (an object without its own __repr__); such calls are not cached.
+    """
+    try:
+        payload = orjson.dumps([_tag_key_value(args), _tag_key_value(kwargs)])
+    except TypeError:
+        return None
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
 def cached(ttl: int = 300):
     """
     Decorator for caching function results.
@@ -85,8 +156,10 @@ def cached(ttl: int = 300):
     def decorator(func: Callable):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Create cache key from function name and arguments
-            cache_key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
+            # Create cache key from arguments (each function has its own cache)
+            cache_key = make_cache_key(args, kwargs)
+            if cache_key is None:
+                return func(*args, **kwargs)
             
             # Try to get from cache
             cached_result = cache.get(cache_key)
@@ -114,3 +187,4 @@ def cached(ttl: int = 300):
 room_cache = LRUCache(max_size=500, ttl=300)
 user_cache = LRUCache(max_size=1000, ttl=600)
 message_cache = LRUCache(max_size=2000, ttl=180)
+search_cache = LRUCache(max_size=1024, ttl=600)
@@ -2,10 +2,38 @@
 Structured logging configuration
 """
 import sys
+import time
+import queue
+import atexit
 import logging
-from typing import Any
-from datetime import datetime
-import json
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Optional
+import orjson
+
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 5
+
+# Background thread writing queued records to the log file
+_file_listener: Optional[QueueListener] = None
+
+# (epoch second, "YYYY-MM-DDTHH:MM:SS") of the last formatted timestamp
+_last_timestamp_second = (-1, "")
+
+
+def _format_timestamp(created: float) -> str:
+    """
+    ISO-8601 UTC timestamp for a LogRecord.created value.
+    
+    The date/time prefix only changes once a second, so it is reused
+    across records and only the microseconds are formatted per call.
+    """
+    global _last_timestamp_second
+    second = int(created)
+    cached_second, prefix = _last_timestamp_second
+    if second != cached_second:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        _last_timestamp_second = (second, prefix)
+    return f"{prefix}.{int((created - second) * 1_000_000):06d}Z"
 
 
 class JSONFormatter(logging.Formatter):
@@ -14,7 +42,7 @@ class JSONFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
         """Format log record as JSON"""
         log_data = {
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "timestamp": _format_timestamp(record.created),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -31,7 +59,7 @@ class JSONFormatter(logging.Formatter):
         if hasattr(record, "extra"):
             log_data.update(record.extra)
         
-        return json.dumps(log_data)
+        return orjson.dumps(log_data, default=str).decode()
 
 
 class ColoredFormatter(logging.Formatter):
@@ -46,11 +74,45 @@ class ColoredFormatter(logging.Formatter):
     }
     RESET = '\033[0m'
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.colored_levels = {
+            level: f"{color}{level}{self.RESET}" for level, color in self.COLORS.items()
+        }
+    
     def format(self, record: logging.LogRecord) -> str:
         """Format with colors"""
-        color = self.COLORS.get(record.levelname, self.RESET)
-        record.levelname = f"{color}{record.levelname}{self.RESET}"
-        return super().format(record)
+        # The record is shared with the other handlers, so the colored
+        # level name is only swapped in for the duration of this call
+        levelname = record.levelname
+        record.levelname = self.colored_levels.get(levelname, levelname)
+        try:
+            return super().format(record)
+        finally:
+            record.levelname = levelname
+
+
+class _LocalQueueHandler(QueueHandler):
+    """QueueHandler for an in-process queue; the file handler does the formatting"""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge %-args now, since they may change after the call returns.
+        # Unlike the base class, keep exc_info so the file formatter can
+        # still render the exception (the record never leaves the process)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def stop_file_logging():
+    """Flush queued records to the log file and stop its writer thread"""
+    global _file_listener
+    if _file_listener is not None:
+        _file_listener.stop()
+        _file_listener = None
+
+
+atexit.register(stop_file_logging)
 
 
 def setup_logging(
@@ -69,6 +131,8 @@ def setup_logging(
     Returns:
         Configured logger instance
     """
+    global _file_listener
+    
     # Create logger
     logger = logging.getLogger("fastapi_video_chat")
     logger.setLevel(getattr(logging, level.upper()))
@@ -90,9 +154,13 @@ def setup_logging(
     
     logger.addHandler(console_handler)
     
-    # File handler (if specified)
+    # File handler (if specified). Records are queued and written by a
+    # listener thread, so logging calls never block on file I/O
+    stop_file_logging()
     if log_file:
-        file_handler = logging.FileHandler(log_file)
+        file_handler = RotatingFileHandler(
+            log_file, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT
+        )
         file_handler.setLevel(logging.DEBUG)
         
         if json_logs:
@@ -103,7 +171,10 @@ def setup_logging(
             )
             file_handler.setFormatter(file_formatter)
         
-        logger.addHandler(file_handler)
+        log_queue: queue.Queue = queue.Queue(-1)
+        _file_listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        _file_listener.start()
+        logger.addHandler(_LocalQueueHandler(log_queue))
     
     return logger
 
@@ -124,55 +195,67 @@ class ContextLogger:
         """Clear context information"""
         self.context.clear()
     
-    def _log(self, level: int, message: str, **kwargs):
-        """Log with context"""
-        extra = {**self.context, **kwargs}
-        self.logger.log(level, message, extra={"extra": extra})
+    def _log(self, level: int, message: str, *args, **kwargs):
+        """Log with context; %-style args are formatted only if emitted"""
+        if not self.logger.isEnabledFor(level):
+            return
+        if self.context:
+            # Merged into a new dict so the record keeps a snapshot even if
+            # the context changes before a handler formats it
+            extra = {**self.context, **kwargs}
+        elif kwargs:
+            extra = kwargs  # already a fresh dict per call
+        else:
+            self.logger.log(level, message, *args)
+            return
+        self.logger.log(level, message, *args, extra={"extra": extra})
     
-    def debug(self, message: str, **kwargs):
-        self._log(logging.DEBUG, message, **kwargs)
+    def debug(self, message: str, *args, **kwargs):
+        self._log(logging.DEBUG, message, *args, **kwargs)
     
-    def info(self, message: str, **kwargs):
-        self._log(logging.INFO, message, **kwargs)
+    def info(self, message: str, *args, **kwargs):
+        self._log(logging.INFO, message, *args, **kwargs)
     
-    def warning(self, message: str, **kwargs):
-        self._log(logging.WARNING, message, **kwargs)
+    def warning(self, message: str, *args, **kwargs):
+        self._log(logging.WARNING, message, *args, **kwargs)
     
-    def error(self, message: str, **kwargs):
-        self._log(logging.ERROR, message, **kwargs)
+    def error(self, message: str, *args, **kwargs):
+        self._log(logging.ERROR, message, *args, **kwargs)
     
-    def critical(self, message: str, **kwargs):
-        self._log(logging.CRITICAL, message, **kwargs)
+    def critical(self, message: str, *args, **kwargs):
+        self._log(logging.CRITICAL, message, *args, **kwargs)
 
 
 # Request logging middleware
 async def log_request(request, call_next):
     """Middleware to log all requests"""
     logger = logging.getLogger("fastapi_video_chat")
+    if not logger.isEnabledFor(logging.INFO):
+        return await call_next(request)
     
-    start_time = datetime.utcnow()
+    start_time = time.perf_counter()
     
     logger.info(
-        f"Request started",
-        extra={
+        "Request started",
+        extra={"extra": {
             "method": request.method,
             "path": request.url.path,
             "client": request.client.host if request.client else "unknown"
-        }
+        }}
     )
     
     response = await call_next(request)
     
-    duration = (datetime.utcnow() - start_time).total_seconds()
+    duration = time.perf_counter() - start_time
     
     logger.info(
-        f"Request completed",
-        extra={
+        "Request completed",
+        extra={"extra": {
             "method": request.method,
             "path": request.url.path,
             "status_code": response.status_code,
             "duration_seconds": duration
-        }
+        }}
     )
     
     return response
@@ -2,10 +2,16 @@
 Metrics collection and monitoring utilities
 """
 import time
-from typing import Dict, Optional
+import functools
+import threading
+from typing import Deque, Dict, Optional, Sequence
 from dataclasses import dataclass, field
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
+
+# Number of recent request durations kept for the average and percentiles
+MAX_REQUEST_DURATIONS = 1000
+REPORTED_PERCENTILES = (50, 95, 99)
 
 
 @dataclass
@@ -29,7 +35,10 @@ class Metrics:
     videos_processed: int = 0
     
     # Performance metrics
-    request_durations: list = field(default_factory=list)
+    request_durations: Deque[float] = field(
+        default_factory=lambda: deque(maxlen=MAX_REQUEST_DURATIONS)
+    )
+    _duration_sum: float = field(default=0.0, repr=False)
     error_count: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
     
     # Timestamp
@@ -39,7 +48,35 @@ class Metrics:
         """Calculate average request duration"""
         if not self.request_durations:
             return 0.0
-        return sum(self.request_durations) / len(self.request_durations)
+        return self._duration_sum / len(self.request_durations)
+    
+    def percentiles(self, qs: Sequence[float] = REPORTED_PERCENTILES) -> Dict[float, float]:
+        """
+        Request duration percentiles over the recent window.
+        
+        Linear interpolation between closest ranks (numpy's default). The
+        window is sorted once per call; this only runs when metrics are read.
+        """
+        if not self.request_durations:
+            return {q: 0.0 for q in qs}
+        ordered = sorted(self.request_durations)
+        last = len(ordered) - 1
+        result = {}
+        for q in qs:
+            rank = last * q / 100
+            low = int(rank)
+            high = min(low + 1, last)
+            result[q] = ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+        return result
+    
+    def add_request_duration(self, duration: float):
+        """Append a duration, keeping a running sum over the window"""
+        durations = self.request_durations
+        if len(durations) == durations.maxlen:
+            # The deque drops the oldest sample on append
+            self._duration_sum -= durations[0]
+        durations.append(duration)
+        self._duration_sum += duration
     
     def success_rate(self) -> float:
         """Calculate request success rate"""
@@ -56,7 +93,11 @@ class Metrics:
                 "successful": self.successful_requests,
                 "failed": self.failed_requests,
                 "success_rate": f"{self.success_rate():.2f}%",
-                "average_duration_ms": f"{self.average_request_duration():.2f}"
+                "average_duration_ms": f"{self.average_request_duration():.2f}",
+                **{
+                    f"p{q}_duration_ms": f"{value:.2f}"
+                    for q, value in self.percentiles().items()
+                }
             },
             "websocket": {
                 "active_connections": self.active_connections,
@@ -81,12 +122,21 @@ class Metrics:
         self.messages_sent = 0
         self.messages_received = 0
         self.request_durations.clear()
+        self._duration_sum = 0.0
         self.error_count.clear()
         self.last_reset = datetime.utcnow()
 
 
 class MetricsCollector:
-    """Singleton metrics collector"""
+    """
+    Singleton metrics collector.
+    
+    Sync endpoints run in the threadpool, so updates are serialized with one
+    lock: the counters are read-modify-write, the duration window updates a
+    running sum alongside the deque, and reading metrics iterates the deque
+    (which raises if another thread appends meanwhile). The lock is held
+    only for a few field updates.
+    """
     
     _instance: Optional['MetricsCollector'] = None
     
@@ -94,56 +144,65 @@ class MetricsCollector:
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance.metrics = Metrics()
+            cls._instance._lock = threading.Lock()
         return cls._instance
     
-    def record_request(self, duration: float, success: bool = True):
-        """Record API request"""
-        self.metrics.total_requests += 1
-        if success:
-            self.metrics.successful_requests += 1
-        else:
-            self.metrics.failed_requests += 1
-        
-        # Keep only last 1000 durations to prevent memory growth
-        if len(self.metrics.request_durations) > 1000:
-            self.metrics.request_durations.pop(0)
-        self.metrics.request_durations.append(duration)
+    def record_request(self, duration: float, success: bool = True, error_type: Optional[str] = None):
+        """Record API request (and the error that failed it, if given)"""
+        metrics = self.metrics
+        with self._lock:
+            metrics.total_requests += 1
+            if success:
+                metrics.successful_requests += 1
+            else:
+                metrics.failed_requests += 1
+            if error_type is not None:
+                metrics.error_count[error_type] += 1
+            metrics.add_request_duration(duration)
     
     def record_websocket_connection(self, connected: bool = True):
         """Record WebSocket connection"""
-        if connected:
-            self.metrics.active_connections += 1
-            self.metrics.total_connections += 1
-        else:
-            self.metrics.active_connections = max(0, self.metrics.active_connections - 1)
+        metrics = self.metrics
+        with self._lock:
+            if connected:
+                metrics.active_connections += 1
+                metrics.total_connections += 1
+            else:
+                metrics.active_connections = max(0, metrics.active_connections - 1)
     
     def record_message(self, sent: bool = True):
         """Record WebSocket message"""
-        if sent:
-            self.metrics.messages_sent += 1
-        else:
-            self.metrics.messages_received += 1
+        with self._lock:
+            if sent:
+                self.metrics.messages_sent += 1
+            else:
+                self.metrics.messages_received += 1
     
     def record_video_event(self, event_type: str):
         """Record video-related event"""
-        if event_type == "live_stream":
-            self.metrics.live_streams_created += 1
-        elif event_type == "upload":
-            self.metrics.videos_uploaded += 1
-        elif event_type == "processed":
-            self.metrics.videos_processed += 1
+        metrics = self.metrics
+        with self._lock:
+            if event_type == "live_stream":
+                metrics.live_streams_created += 1
+            elif event_type == "upload":
+                metrics.videos_uploaded += 1
+            elif event_type == "processed":
+                metrics.videos_processed += 1
     
     def record_error(self, error_type: str):
         """Record error occurrence"""
-        self.metrics.error_count[error_type] += 1
+        with self._lock:
+            self.metrics.error_count[error_type] += 1
     
     def get_metrics(self) -> dict:
         """Get current metrics"""
-        return self.metrics.to_dict()
+        with self._lock:
+            return self.metrics.to_dict()
     
     def reset(self):
         """Reset all metrics"""
-        self.metrics.reset()
+        with self._lock:
+            self.metrics.reset()
 
 
 # Global metrics instance
@@ -153,17 +212,17 @@ metrics_collector = MetricsCollector()
 # Decorator for automatic request timing
 def timed_endpoint(func):
     """Decorator to automatically time endpoint execution"""
+    @functools.wraps(func)
     async def wrapper(*args, **kwargs):
-        start_time = time.time()
+        start_time = time.perf_counter()
         try:
             result = await func(*args, **kwargs)
-            duration = (time.time() - start_time) * 1000  # Convert to ms
-            metrics_collector.record_request(duration, success=True)
-            return result
         except Exception as e:
-            duration = (time.time() - start_time) * 1000
-            metrics_collector.record_request(duration, success=False)
-            metrics_collector.record_error(type(e).__name__)
+            duration = (time.perf_counter() - start_time) * 1000  # Convert to ms
+            metrics_collector.record_request(duration, success=False, error_type=type(e).__name__)
             raise
+        duration = (time.perf_counter() - start_time) * 1000
+        metrics_collector.record_request(duration, success=True)
+        return result
     
     return wrapper
@@ -1,25 +1,225 @@
 import trimesh
 import numpy as np
 import os
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
 
-def generate_simple_cube(size: float = 1.0) -> trimesh.Trimesh:
+# Keyword -> (priority, shape); when a prompt names several shapes the
+# earliest group wins, as in the original if/elif order
+_SHAPE_GROUPS = (
+    ("animal", ("cat", "dog", "animal", "pet")),
+    ("humanoid", ("person", "human", "character")),
+    ("cube", ("cube", "box", "square")),
+    ("sphere", ("sphere", "ball", "circle", "orb")),
+    ("cylinder", ("cylinder", "tube", "pipe")),
+    ("cone", ("cone", "pyramid", "triangle")),
+    ("torus", ("torus", "ring", "donut", "doughnut")),
+    ("capsule", ("capsule", "pill")),
+    ("table", ("table", "desk")),
+    ("chair", ("chair", "seat")),
+    ("tree", ("tree", "plant")),
+    ("house", ("house", "building")),
+    ("car", ("car", "vehicle", "truck")),
+)
+_SHAPE_KEYWORDS: Dict[str, Tuple[int, str]] = {
+    word: (priority, shape)
+    for priority, (shape, words) in enumerate(_SHAPE_GROUPS)
+    for word in words
+}
+
+_COLOR_GROUPS = (
+    ((255, 0, 0, 255), ("red",)),
+    ((0, 0, 255, 255), ("blue",)),
+    ((0, 255, 0, 255), ("green",)),
+    ((255, 255, 0, 255), ("yellow",)),
+    ((128, 0, 128, 255), ("purple",)),
+    ((255, 165, 0, 255), ("orange",)),
+    ((255, 192, 203, 255), ("pink",)),
+    ((139, 69, 19, 255), ("brown",)),
+    ((255, 255, 255, 255), ("white",)),
+    ((0, 0, 0, 255), ("black",)),
+    ((128, 128, 128, 255), ("gray", "grey")),
+)
+_COLOR_KEYWORDS: Dict[str, Tuple[int, Tuple[int, int, int, int]]] = {
+    word: (priority, color)
+    for priority, (color, words) in enumerate(_COLOR_GROUPS)
+    for word in words
+}
+DEFAULT_COLOR = (200, 200, 200, 255)  # light gray
+
+_WORD_PATTERN = re.compile(r"[a-z]+")
+# "-es" plurals only follow sibilants (boxes, benches); elsewhere only "-s"
+# is stripped, so "cares" does not match "car"
+_SIBILANT_ES_SUFFIXES = ("ses", "xes", "zes", "ches", "shes")
+
+# Output directories already created by generate_model_from_prompt
+_ensured_dirs: Set[str] = set()
+
+# Primitives are built once per parameter set and copied per request; a copy
+# is many times cheaper than re-running trimesh's vertex generation
+# (icosphere subdivision in particular). Callers must never mutate these.
+@lru_cache(maxsize=32)
+def _cube_template(size: float) -> trimesh.Trimesh:
     return trimesh.creation.box(extents=[size, size, size])
 
-def generate_simple_sphere(radius: float = 1.0, subdivisions: int = 3) -> trimesh.Trimesh:
+@lru_cache(maxsize=32)
+def _sphere_template(radius: float, subdivisions: int) -> trimesh.Trimesh:
     return trimesh.creation.icosphere(subdivisions=subdivisions, radius=radius)
 
-def generate_simple_cylinder(radius: float = 0.5, height: float = 2.0) -> trimesh.Trimesh:
+@lru_cache(maxsize=32)
+def _cylinder_template(radius: float, height: float) -> trimesh.Trimesh:
     return trimesh.creation.cylinder(radius=radius, height=height)
 
-def generate_simple_cone(radius: float = 0.5, height: float = 2.0) -> trimesh.Trimesh:
+@lru_cache(maxsize=32)
+def _cone_template(radius: float, height: float) -> trimesh.Trimesh:
     return trimesh.creation.cone(radius=radius, height=height)
 
-def generate_simple_torus(major_radius: float = 1.0, minor_radius: float = 0.3) -> trimesh.Trimesh:
+@lru_cache(maxsize=32)
+def _torus_template(major_radius: float, minor_radius: float) -> trimesh.Trimesh:
     return trimesh.creation.torus(major_radius=major_radius, minor_radius=minor_radius)
 
-def generate_capsule(radius: float = 0.5, height: float = 2.0) -> trimesh.Trimesh:
+@lru_cache(maxsize=32)
+def _capsule_template(radius: float, height: float) -> trimesh.Trimesh:
     return trimesh.creation.capsule(radius=radius, height=height)
 
+def _fresh(template: trimesh.Trimesh) -> trimesh.Trimesh:
+    # Rebuilding from the arrays with process=False skips trimesh's vertex
+    # merge/validation pass and the cache copying done by Trimesh.copy()
+    return trimesh.Trimesh(
+        vertices=template.vertices.copy(), faces=template.faces.copy(), process=False
+    )
+
+def generate_simple_cube(size: float = 1.0) -> trimesh.Trimesh:
+    return _fresh(_cube_template(size))
+
+def generate_simple_sphere(radius: float = 1.0, subdivisions: int = 3) -> trimesh.Trimesh:
+    return _fresh(_sphere_template(radius, subdivisions))
+
+def generate_simple_cylinder(radius: float = 0.5, height: float = 2.0) -> trimesh.Trimesh:
+    return _fresh(_cylinder_template(radius, height))
+
+def generate_simple_cone(radius: float = 0.5, height: float = 2.0) -> trimesh.Trimesh:
+    return _fresh(_cone_template(radius, height))
+
+def generate_simple_torus(major_radius: float = 1.0, minor_radius: float = 0.3) -> trimesh.Trimesh:
+    return _fresh(_torus_template(major_radius, minor_radius))
+
+def generate_capsule(radius: float = 0.5, height: float = 2.0) -> trimesh.Trimesh:
+    return _fresh(_capsule_template(radius, height))
+
+def _assemble(parts: Iterable[Tuple[trimesh.Trimesh, object, object]]) -> trimesh.Trimesh:
+    """
+    Build one mesh from (template, scale, offset) parts.
+    
+    Each part's vertices are scaled and translated straight into one
+    preallocated array (and its faces re-indexed into another), instead of
+    copying, transforming and concatenating a mesh per part.
+    """
+    parts = list(parts)
+    vertices = np.empty((sum(len(t.vertices) for t, _, _ in parts), 3))
+    faces = np.empty((sum(len(t.faces) for t, _, _ in parts), 3), dtype=np.int64)
+    v = f = 0
+    for template, scale, offset in parts:
+        n, m = len(template.vertices), len(template.faces)
+        np.multiply(template.vertices, scale, out=vertices[v:v + n])
+        vertices[v:v + n] += offset
+        np.add(template.faces, v, out=faces[f:f + m])
+        v += n
+        f += m
+    # process=False: the parts are already clean, skip vertex merging
+    return trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+
+@lru_cache(maxsize=None)
+def _color_material(color: Tuple[int, int, int, int]) -> trimesh.visual.material.PBRMaterial:
+    # A single base color is stored as four numbers in the GLB material,
+    # rather than broadcast into a per-vertex RGBA buffer
+    return trimesh.visual.material.PBRMaterial(baseColorFactor=color)
+
+def _match_keyword(words: Iterable[str], keywords: Dict[str, tuple]) -> Optional[object]:
+    """Highest-priority keyword value among the words, allowing plural forms"""
+    best = None
+    for word in words:
+        match = keywords.get(word)
+        if match is None and word.endswith("s"):
+            match = keywords.get(word[:-1])
+            if match is None and word.endswith(_SIBILANT_ES_SUFFIXES):
+                match = keywords.get(word[:-2])
+        if match is not None and (best is None or match[0] < best[0]):
+            best = match
+    return None if best is None else best[1]
+
+# Composite shapes, built from cached primitives in one allocation
+def _build_animal() -> trimesh.Trimesh:
+    # Simple cat/dog approximation: body (cylinder) + head (sphere)
+    return _assemble([
+        (_cylinder_template(0.4, 1.2), 1.0, 0.0),
+        (_sphere_template(0.5, 2), 1.0, (0, 0, 1.0)),
+    ])
+
+def _build_humanoid() -> trimesh.Trimesh:
+    # Simple humanoid: body + head
+    return _assemble([
+        (_cylinder_template(0.3, 1.5), 1.0, 0.0),
+        (_sphere_template(0.3, 2), 1.0, (0, 0, 1.2)),
+    ])
+
+def _build_table() -> trimesh.Trimesh:
+    # Simple table: top (cube) + legs (cylinders)
+    leg = _cylinder_template(0.05, 0.7)
+    return _assemble([
+        (_cube_template(2.0), (1.0, 1.0, 0.1), (0, 0, 0.7)),
+        (leg, 1.0, (0.9, 0.9, 0)),
+        (leg, 1.0, (0.9, -0.9, 0)),
+        (leg, 1.0, (-0.9, 0.9, 0)),
+        (leg, 1.0, (-0.9, -0.9, 0)),
+    ])
+
+def _build_chair() -> trimesh.Trimesh:
+    # Simple chair: seat + back
+    return _assemble([
+        (_cube_template(1.0), (1.0, 1.0, 0.1), (0, 0, 0.45)),
+        (_cube_template(1.0), (1.0, 0.1, 1.0), (0, -0.45, 0.95)),
+    ])
+
+def _build_tree() -> trimesh.Trimesh:
+    # Simple tree: trunk + crown
+    return _assemble([
+        (_cylinder_template(0.2, 2.0), 1.0, 0.0),
+        (_sphere_template(1.0, 3), 1.0, (0, 0, 2.5)),
+    ])
+
+def _build_house() -> trimesh.Trimesh:
+    # Simple house: base + roof
+    return _assemble([
+        (_cube_template(2.0), 1.0, 0.0),
+        (_cone_template(1.5, 1.0), 1.0, (0, 0, 1.5)),
+    ])
+
+def _build_car() -> trimesh.Trimesh:
+    # Simple car: body + cabin
+    return _assemble([
+        (_cube_template(2.0), (1.5, 0.8, 0.5), 0.0),
+        (_cube_template(1.0), (0.8, 0.8, 0.6), (0, 0, 0.55)),
+    ])
+
+# Shape name (see _SHAPE_GROUPS) -> mesh builder
+_SHAPE_BUILDERS: Dict[str, Callable[[], trimesh.Trimesh]] = {
+    "animal": _build_animal,
+    "humanoid": _build_humanoid,
+    "cube": generate_simple_cube,
+    "sphere": generate_simple_sphere,
+    "cylinder": generate_simple_cylinder,
+    "cone": generate_simple_cone,
+    "torus": generate_simple_torus,
+    "capsule": generate_capsule,
+    "table": _build_table,
+    "chair": _build_chair,
+    "tree": _build_tree,
+    "house": _build_house,
+    "car": _build_car,
+}
+
 def generate_model_from_prompt(prompt: str, output_path: str) -> str:
     """
     Generate a 3D model based on a text prompt.
@@ -27,126 +227,32 @@ def generate_model_from_prompt(prompt: str, output_path: str) -> str:
     """
     prompt_lower = prompt.lower()
 
-    # Animal/Character shapes - approximate with primitives
-    if any(word in prompt_lower for word in ["cat", "dog", "animal", "pet"]):
-        # Simple cat/dog approximation: body (cylinder) + head (sphere)
-        body = generate_simple_cylinder(radius=0.4, height=1.2)
-        head = generate_simple_sphere(radius=0.5, subdivisions=2)
-        head.apply_translation([0, 0, 1.0])
-        mesh = trimesh.util.concatenate([body, head])
-
-    elif any(word in prompt_lower for word in ["person", "human", "character"]):
-        # Simple humanoid: body + head
-        body = generate_simple_cylinder(radius=0.3, height=1.5)
-        head = generate_simple_sphere(radius=0.3, subdivisions=2)
-        head.apply_translation([0, 0, 1.2])
-        mesh = trimesh.util.concatenate([body, head])
-
-    # Basic shapes
-    elif any(word in prompt_lower for word in ["cube", "box", "square"]):
-        mesh = generate_simple_cube()
-
-    elif any(word in prompt_lower for word in ["sphere", "ball", "circle", "orb"]):
-        mesh = generate_simple_sphere()
-
-    elif any(word in prompt_lower for word in ["cylinder", "tube", "pipe"]):
-        mesh = generate_simple_cylinder()
-
-    elif any(word in prompt_lower for word in ["cone", "pyramid", "triangle"]):
-        mesh = generate_simple_cone()
-
-    elif any(word in prompt_lower for word in ["torus", "ring", "donut", "doughnut"]):
-        mesh = generate_simple_torus()
-
-    elif any(word in prompt_lower for word in ["capsule", "pill"]):
-        mesh = generate_capsule()
-
-    # Objects
-    elif any(word in prompt_lower for word in ["table", "desk"]):
-        # Simple table: top (cube) + legs (cylinders)
-        top = generate_simple_cube(size=2.0)
-        top.apply_scale([1.0, 1.0, 0.1])
-        top.apply_translation([0, 0, 0.7])
-
-        leg1 = generate_simple_cylinder(radius=0.05, height=0.7)
-        leg2 = leg1.copy()
-        leg3 = leg1.copy()
-        leg4 = leg1.copy()
-
-        leg1.apply_translation([0.9, 0.9, 0])
-        leg2.apply_translation([0.9, -0.9, 0])
-        leg3.apply_translation([-0.9, 0.9, 0])
-        leg4.apply_translation([-0.9, -0.9, 0])
-
-        mesh = trimesh.util.concatenate([top, leg1, leg2, leg3, leg4])
-
-    elif any(word in prompt_lower for word in ["chair", "seat"]):
-        # Simple chair: seat + back
-        seat = generate_simple_cube(size=1.0)
-        seat.apply_scale([1.0, 1.0, 0.1])
-        seat.apply_translation([0, 0, 0.45])
-        back = generate_simple_cube(size=1.0)
-        back.apply_scale([1.0, 0.1, 1.0])
-        back.apply_translation([0, -0.45, 0.95])
-        mesh = trimesh.util.concatenate([seat, back])
-
-    elif any(word in prompt_lower for word in ["tree", "plant"]):
-        # Simple tree: trunk + crown
-        trunk = generate_simple_cylinder(radius=0.2, height=2.0)
-        crown = generate_simple_sphere(radius=1.0)
-        crown.apply_translation([0, 0, 2.5])
-        mesh = trimesh.util.concatenate([trunk, crown])
-
-    elif any(word in prompt_lower for word in ["house", "building"]):
-        # Simple house: base + roof
-        base = generate_simple_cube(size=2.0)
-        roof = generate_simple_cone(radius=1.5, height=1.0)
-        roof.apply_translation([0, 0, 1.5])
-        mesh = trimesh.util.concatenate([base, roof])
-
-    elif any(word in prompt_lower for word in ["car", "vehicle", "truck"]):
-        # Simple car: body + cabin
-        body = generate_simple_cube(size=2.0)
-        body.apply_scale([1.5, 0.8, 0.5])
-        cabin = generate_simple_cube(size=1.0)
-        cabin.apply_scale([0.8, 0.8, 0.6])
-        cabin.apply_translation([0, 0, 0.55])
-        mesh = trimesh.util.concatenate([body, cabin])
-
+    # Fast path: a bare shape name ("sphere", "Cube ") needs no tokenizing
+    match = _SHAPE_KEYWORDS.get(prompt_lower.strip())
+    if match is not None:
+        shape, color = match[1], DEFAULT_COLOR
     else:
-        # Default: sphere (more interesting than cube)
-        mesh = generate_simple_sphere()
+        words = set(_WORD_PATTERN.findall(prompt_lower))
+        shape = _match_keyword(words, _SHAPE_KEYWORDS)
+        color = _match_keyword(words, _COLOR_KEYWORDS) or DEFAULT_COLOR
+
+    # Default: sphere (more interesting than cube)
+    mesh = _SHAPE_BUILDERS.get(shape, generate_simple_sphere)()
 
     # Apply colors based on keywords
-    if "red" in prompt_lower:
-        mesh.visual.vertex_colors = [255, 0, 0, 255]
-    elif "blue" in prompt_lower:
-        mesh.visual.vertex_colors = [0, 0, 255, 255]
-    elif "green" in prompt_lower:
-        mesh.visual.vertex_colors = [0, 255, 0, 255]
-    elif "yellow" in prompt_lower:
-        mesh.visual.vertex_colors = [255, 255, 0, 255]
-    elif "purple" in prompt_lower:
-        mesh.visual.vertex_colors = [128, 0, 128, 255]
-    elif "orange" in prompt_lower:
-        mesh.visual.vertex_colors = [255, 165, 0, 255]
-    elif "pink" in prompt_lower:
-        mesh.visual.vertex_colors = [255, 192, 203, 255]
-    elif "brown" in prompt_lower:
-        mesh.visual.vertex_colors = [139, 69, 19, 255]
-    elif "white" in prompt_lower:
-        mesh.visual.vertex_colors = [255, 255, 255, 255]
-    elif "black" in prompt_lower:
-        mesh.visual.vertex_colors = [0, 0, 0, 255]
-    elif "gray" in prompt_lower or "grey" in prompt_lower:
-        mesh.visual.vertex_colors = [128, 128, 128, 255]
-    else:
-        # Default color: light gray
-        mesh.visual.vertex_colors = [200, 200, 200, 255]
+    mesh.visual = trimesh.visual.TextureVisuals(material=_color_material(color))
 
-    # Ensure directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # Ensure directory exists (once per directory; a directory removed
+    # since then is recreated when the export fails)
+    directory = os.path.dirname(output_path)
+    if directory not in _ensured_dirs:
+        os.makedirs(directory, exist_ok=True)
+        _ensured_dirs.add(directory)
 
     # Export as GLB
-    mesh.export(output_path, file_type='glb')
+    try:
+        mesh.export(output_path, file_type='glb')
+    except FileNotFoundError:
+        os.makedirs(directory, exist_ok=True)
+        mesh.export(output_path, file_type='glb')
     return output_path
@@ -0,0 +1,116 @@
+"""
+Redis-backed cache shared across workers, with in-process fallback
+"""
+import os
+import logging
+import threading
+from typing import Any, Optional
+import orjson
+from utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+REDIS_MAX_CONNECTIONS = 50
+
+_redis_client = None
+_redis_resolved = False
+_redis_lock = threading.Lock()
+
+
+def get_redis_client():
+    """
+    Get the shared redis.asyncio client configured by REDIS_URL.
+
+    Returns None when REDIS_URL is unset or the redis package is not
+    installed, in which case caches stay process-local.
+    """
+    global _redis_client, _redis_resolved
+    if not _redis_resolved:
+        with _redis_lock:
+            if not _redis_resolved:
+                url = os.getenv("REDIS_URL")
+                if url:
+                    try:
+                        import redis.asyncio as redis_asyncio
+                        _redis_client = redis_asyncio.from_url(
+                            url, max_connections=REDIS_MAX_CONNECTIONS
+                        )
+                        logger.info("✓ Shared cache enabled via Redis")
+                    except ImportError:
+                        logger.warning("REDIS_URL set but redis package not installed - using local cache")
+                _redis_resolved = True
+    return _redis_client
+
+
+class AsyncRedisCache:
+    """
+    Async cache that stores orjson-serialized values in Redis.
+
+    Keys are namespaced as "<namespace>:<key>". When no Redis client is
+    available, or a Redis call fails, the in-process LRUCache is used.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_size: int = 1000,
+        ttl: int = 300,
+        redis_client=None
+    ):
+        """
+        Args:
+            namespace: Key prefix for this cache
+            max_size: Maximum number of items in the local fallback
+            ttl: Time to live in seconds
+            redis_client: redis.asyncio client (defaults to get_redis_client())
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = LRUCache(max_size=max_size, ttl=ttl)
+        self._redis_client = redis_client
+
+    @property
+    def redis_client(self):
+        """Injected client, or the shared client from REDIS_URL"""
+        if self._redis_client is None:
+            return get_redis_client()
+        return self._redis_client
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Get value from cache"""
+        client = self.redis_client
+        if client is not None:
+            try:
+                raw = await client.get(self._key(key))
+                return None if raw is None else orjson.loads(raw)
+            except Exception as e:
+                logger.warning("Redis cache get failed, using local cache: %s", e)
+        return self.local.get(key)
+
+    async def set(self, key: str, value: Any) -> None:
+        """Set value in cache"""
+        client = self.redis_client
+        if client is not None:
+            try:
+                await client.set(self._key(key), orjson.dumps(value), ex=self.ttl)
+                return
+            except Exception as e:
+                logger.warning("Redis cache set failed, using local cache: %s", e)
+        self.local.set(key, value)
+
+    async def delete(self, key: str) -> None:
+        """Delete value from cache"""
+        client = self.redis_client
+        if client is not None:
+            try:
+                await client.delete(self._key(key))
+            except Exception as e:
+                logger.warning("Redis cache delete failed: %s", e)
+        self.local.delete(key)
+
+
+# Shared cache instances (Redis when REDIS_URL is set, else per-process)
+shared_message_cache = AsyncRedisCache("message", max_size=2000, ttl=180)
@@ -13,6 +13,40 @@ class InputValidator:
     USERNAME_PATTERN = re.compile(r'^[a-zA-Z0-9_-]{2,50}$')
     ROOM_NAME_PATTERN = re.compile(r'^[a-zA-Z0-9_\s-]{2,100}$')
     
+    # Spam scoring patterns
+    # Only explicit links count: bare "name.ext" matches file names (main.py, README.md)
+    URL_PATTERN = re.compile(r'\b(?:https?://|www\.)\S+', re.IGNORECASE)
+    URL_SHORTENER_PATTERN = re.compile(
+        r'\b(bit\.ly|tinyurl\.com|t\.co|goo\.gl|ow\.ly|is\.gd|buff\.ly|cutt\.ly|rb\.gy|shorturl\.at)/',
+        re.IGNORECASE
+    )
+    SPAM_KEYWORD_PATTERN = re.compile(
+        r'(buy|click|discount|free|winner|congratulations)\s+(now|here)', re.IGNORECASE
+    )
+    CRYPTO_SOLICITATION_PATTERN = re.compile(
+        r'\b(bitcoin|btc|crypto|usdt|eth|airdrop|giveaway|forex|investment)\b'
+        r'.*\b(send|dm|whatsapp|telegram|double|guaranteed|profit|wallet)\b',
+        re.IGNORECASE | re.DOTALL
+    )
+    REPEATED_CHAR_PATTERN = re.compile(r'(\w)\1{10,}')
+    EMOJI_PATTERN = re.compile('[\U0001F300-\U0001FAFF\u2600-\u27BF]')
+    CONFUSABLE_PATTERN = re.compile(
+        r'[a-zA-Z][\u0370-\u03FF\u0400-\u04FF]|[\u0370-\u03FF\u0400-\u04FF][a-zA-Z]'
+    )
+    # Known-benign chat lines that need no AI moderation, compared after
+    # lowercasing and collapsing spaces and . , ! ? ("Hi!!", "ok, thanks")
+    TRIVIAL_PHRASES = frozenset({
+        "hi", "hii", "hello", "hey", "hey all", "hi all", "hello all", "hi everyone",
+        "hello everyone", "hey everyone", "yo", "sup", "gm", "gn", "good morning",
+        "good afternoon", "good evening", "good night", "ok", "okay", "ok thanks",
+        "k", "kk", "yes", "yeah", "yep", "no", "nope", "sure", "cool", "nice",
+        "great", "awesome", "lol", "lmao", "haha", "hahaha", "thanks", "thank you",
+        "thanks all", "thx", "ty", "np", "no problem", "you're welcome", "welcome",
+        "bye", "goodbye", "bye all", "see you", "see ya", "cya", "later", "brb",
+        "back", "afk", "same", "agreed", "me too", "how are you", "what's up",
+    })
+    TRIVIAL_SEPARATOR_PATTERN = re.compile(r'[ .,!?]+')
+    
     @staticmethod
     def sanitize_string(text: str, max_length: int = 1000) -> str:
         """Remove HTML tags and limit length"""
@@ -103,3 +137,42 @@ class InputValidator:
                 return True
         
         return False
+
+    @staticmethod
+    def spam_score(text: str) -> float:
+        """
+        Cheap heuristic spam score between 0.0 (clean) and 1.0 (certain spam)
+        """
+        if not text:
+            return 0.0
+        
+        url_count = len(InputValidator.URL_PATTERN.findall(text))
+        if url_count > 3:
+            return 1.0
+        
+        score = 0.25 * url_count
+        if InputValidator.URL_SHORTENER_PATTERN.search(text):
+            score += 0.5
+        if InputValidator.SPAM_KEYWORD_PATTERN.search(text):
+            score += 0.4
+        if InputValidator.CRYPTO_SOLICITATION_PATTERN.search(text):
+            score += 0.5
+        if InputValidator.REPEATED_CHAR_PATTERN.search(text):
+            score += 0.3
+        if len(InputValidator.EMOJI_PATTERN.findall(text)) > 5:
+            score += 0.3
+        if InputValidator.CONFUSABLE_PATTERN.search(text):
+            score += 0.4
+        
+        return min(score, 1.0)
+    
+    @staticmethod
+    def is_trivially_safe(text: str) -> bool:
+        """
+        True only for known-benign phrases (greetings, thanks, "ok"); these
+        can skip AI moderation. Anything else, however short, is moderated
+        """
+        if len(text) > 40:
+            return False
+        phrase = InputValidator.TRIVIAL_SEPARATOR_PATTERN.sub(" ", text.lower()).strip(" ")
+        return phrase in InputValidator.TRIVIAL_PHRASES